@@ -46,6 +46,55 @@ class TypecastError(Exception):
         Exception.__init__(self)
 
 
+class ParsingLimitExceeded(Exception):
+    """Raised when parsing a request would exceed one of the configured limits.
+
+    The :attr:`code` attribute is the HTTP status code that the host framework
+    should respond with.
+    """
+
+    code = 400
+
+    def __init__(self, what, limit):
+        self.what = what
+        self.limit = limit
+        Exception.__init__(self)
+
+    def __str__(self):
+        return "%s exceeds the limit of %s" % (self.what, self.limit)
+
+
+class URITooLong(ParsingLimitExceeded):
+    """Raised if a path or querystring is too long.
+    """
+
+    code = 414
+
+
+class TooManyParameters(ParsingLimitExceeded):
+    """Raised if a querystring or a path segment has too many parameters.
+    """
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised if none of the byte ranges requested by a client overlap the file.
+
+    The :attr:`code` attribute is the HTTP status code that the host framework
+    should respond with, and :attr:`content_range` is the value of the
+    ``Content-Range`` header it should send.
+    """
+
+    code = 416
+
+    def __init__(self, size):
+        self.size = size
+        self.content_range = 'bytes */%d' % size
+        Exception.__init__(self)
+
+    def __str__(self):
+        return "none of the requested ranges overlap the %d bytes of the file" % self.size
+
+
 class NotFound(NegotiationFailure):
     def __init__(self, message=''):
         self.message = message or "not found"
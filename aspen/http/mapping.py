@@ -6,6 +6,11 @@ from __future__ import unicode_literals
 
 NO_DEFAULT = object()
 
+# Looking up these once is faster than going through the dict class every time.
+_dict_getitem = dict.__getitem__
+_dict_setitem = dict.__setitem__
+_dict_get = dict.get
+
 
 class Mapping(dict):
     """Base class for HTTP mappings.
@@ -16,6 +21,10 @@ class Mapping(dict):
     clobbers to list, while subscript access returns the last item. Think
     about it.
 
+    The lists are part of the public behavior, even for keys that have a
+    single value: they're what ``dict(m)``, ``==`` and ``items()`` see, and
+    :meth:`all` returns the stored list itself, not a copy.
+
     .. warning:: This isn't thread-safe.
 
     """
@@ -24,14 +33,14 @@ class Mapping(dict):
         """Given a name, return the last value or call self.keyerror.
         """
         try:
-            return dict.__getitem__(self, name)[-1]
+            return _dict_getitem(self, name)[-1]
         except KeyError:
             self.keyerror(name)
 
     def __setitem__(self, name, value):
         """Given a name and value, clobber any existing values.
         """
-        dict.__setitem__(self, name, [value])
+        _dict_setitem(self, name, [value])
 
     def keyerror(self, key):
         """Called when a key is missing. Default implementation simply reraises.
@@ -48,7 +57,7 @@ class Mapping(dict):
 
         """
         try:
-            values = dict.__getitem__(self, name)
+            values = _dict_getitem(self, name)
         except KeyError:
             if default is not NO_DEFAULT:
                 return default
@@ -63,20 +72,22 @@ class Mapping(dict):
     def all(self, name):
         """Given a name, return a list of values, possibly empty.
         """
-        return dict.get(self, name, [])
+        return _dict_get(self, name, [])
 
     def get(self, name, default=None):
         """Override to only return the last value.
         """
-        return dict.get(self, name, [default])[-1]
+        values = _dict_get(self, name)
+        return default if values is None else values[-1]
 
     def add(self, name, value):
         """Given a name and value, clobber any existing values with the new one.
         """
-        if name in self:
-            self.all(name).append(value)
+        values = _dict_get(self, name)
+        if values is None:
+            _dict_setitem(self, name, [value])
         else:
-            dict.__setitem__(self, name, [value])
+            values.append(value)
 
     def ones(self, *names):
         """Given one or more names of keys, return a list of their values.
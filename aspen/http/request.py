@@ -3,32 +3,94 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import re
+
 from six import PY2, text_type as str
 from six.moves.urllib.parse import parse_qs, unquote, unquote_plus
 
 from .mapping import Mapping
+from ..exceptions import RangeNotSatisfiable, TooManyParameters, URITooLong
+from ..utils import LRUCache
+
+try:
+    from functools import lru_cache
+except ImportError:
+    # Python 2
+    lru_cache = None
+
+
+# parse_qs splits on ';' too in Python 2 and in Python 3 before 3.9.2
+_QS_SEPARATORS = ('&', ';') if len(parse_qs('a;b', keep_blank_values=True)) == 2 else ('&',)
 
 
 def _decode(o, errors='strict'):
     return o.decode('utf8', errors=errors) if isinstance(o, bytes) else o
 
 
-def path_decode(bs):
+def _unquote_path(bs):
     return _decode(unquote(bs.encode('ascii') if PY2 else bs))
 
 
+def set_path_decode_cache_size(maxsize):
+    """Set the size of the LRU cache used by :func:`path_decode`.
+
+    The cache is shared by all the paths of the process. It only holds
+    strings that contain percent-escapes, the others aren't worth caching.
+    Set `maxsize` to 0 to disable the cache.
+    """
+    global _cached_unquote_path
+    if not maxsize:
+        _cached_unquote_path = _unquote_path
+    elif lru_cache is not None:
+        _cached_unquote_path = lru_cache(maxsize)(_unquote_path)
+    else:
+        cache = LRUCache(maxsize)
+        def _cached_unquote_path(bs):
+            decoded = cache.get(bs)
+            if decoded is None:
+                decoded = cache[bs] = _unquote_path(bs)
+            return decoded
+
+set_path_decode_cache_size(1024)
+
+
+def path_decode(bs):
+    if '%' not in bs:
+        # Fast path, there's nothing to unquote
+        return _decode(bs)
+    return _cached_unquote_path(bs)
+
+
+#: Marks the params of a PathPart as empty, the Mapping is created on access.
+EMPTY = object()
+
+
 class PathPart(str):
     """A string with a mapping for extra data about it."""
 
-    __slots__ = ['params']
+    __slots__ = ['_params']
 
     def __new__(cls, value, params=None):
         obj = super(PathPart, cls).__new__(cls, value)
-        obj.params = params
+        obj._params = params
         return obj
 
+    @property
+    def params(self):
+        params = self._params
+        if params is EMPTY:
+            params = self._params = Mapping()
+        return params
+
+    @params.setter
+    def params(self, params):
+        self._params = params
+
+    def __reduce__(self):
+        return (self.__class__, (str(self), self.params))
+
 
-def extract_rfc2396_params(path):
+def extract_rfc2396_params(path, max_params=None):
     """RFC2396 section 3.3 says that path components of a URI can have
     'a sequence of parameters, indicated by the semicolon ";" character.'
     and that ' Within a path segment, the characters "/", ";", "=", and
@@ -40,10 +102,21 @@ def extract_rfc2396_params(path):
 
     * path should be raw so we don't split or operate on a decoded character
     * output is decoded
+    * TooManyParameters is raised if a segment has more than max_params params
     """
     pathsegs = path.lstrip('/').split('/')
+    if ';' not in path:
+        # Fast path, there are no params
+        if '%' not in path:
+            return [PathPart(s, EMPTY) for s in pathsegs]
+        return [PathPart(path_decode(s), EMPTY) for s in pathsegs]
     segments_with_params = []
     for component in pathsegs:
+        if ';' not in component:
+            segments_with_params.append(PathPart(path_decode(component), EMPTY))
+            continue
+        if max_params is not None and component.count(';') > max_params:
+            raise TooManyParameters("number of path segment parameters", max_params)
         parts = component.split(';')
         params = Mapping()
         segment = path_decode(parts[0])
@@ -60,32 +133,93 @@ def extract_rfc2396_params(path):
 def split_path_no_params(path):
     """This splits a path into parts on "/" only (no split on ";" or ",").
     """
-    return [PathPart(path_decode(s)) for s in path.lstrip('/').split('/')]
+    pathsegs = path.lstrip('/').split('/')
+    if '%' not in path:
+        return [PathPart(s) for s in pathsegs]
+    return [PathPart(path_decode(s)) for s in pathsegs]
 
 
 class Path(Mapping):
     """Represent the path of a resource.
+
+    The path is checked against the limits before it's parsed: URITooLong is
+    raised if it's longer than max_length or has more than max_segments
+    segments, TooManyParameters if a segment has more than max_params params.
     """
 
-    def __init__(self, raw, split_path=extract_rfc2396_params):
+    def __init__(self, raw, split_path=extract_rfc2396_params,
+                 max_length=None, max_segments=None, max_params=None):
+        if max_length is not None and len(raw) > max_length:
+            raise URITooLong("path length", max_length)
+        if max_segments is not None and raw.count('/') > max_segments:
+            raise URITooLong("number of path segments", max_segments)
         self.raw = raw
-        self.decoded = path_decode(raw)
-        self.parts = split_path(raw)
+        if split_path is extract_rfc2396_params:
+            self.parts = split_path(raw, max_params)
+        else:
+            self.parts = split_path(raw)
+        if raw[:1] == '/' and raw[1:2] != '/' and (
+            split_path is split_path_no_params or
+            split_path is extract_rfc2396_params and ';' not in raw
+        ):
+            # The parts are already decoded, don't do it again
+            self.decoded = '/' + '/'.join(self.parts)
+        else:
+            self.decoded = path_decode(raw)
 
 
 class Querystring(Mapping):
     """Represent an HTTP querystring.
+
+    The querystring is only parsed when it's first read, so that requests that
+    never look at it don't pay for it. Until then the object is an instance of
+    :class:`UnparsedQuerystring`. Code that reads the dict storage directly
+    instead of going through a method, e.g. ``dict(qs)``, should call a method
+    first, e.g. ``dict(qs.items())``.
     """
 
-    def __init__(self, raw, errors='replace'):
+    def __init__(self, raw, errors='replace', max_length=None, max_pairs=None):
         """Takes a string of type application/x-www-form-urlencoded.
+
+        URITooLong is raised if it's longer than max_length, TooManyParameters
+        if it has more than max_pairs key/value pairs. Those limits are
+        checked right away, the parsing itself is deferred.
         """
+        self.raw = raw
+        self._errors = errors
+        self._decoded = None
+
+        if not raw:
+            # Nothing to parse
+            return
+
+        if max_length is not None and len(raw) > max_length:
+            raise URITooLong("querystring length", max_length)
+        if max_pairs is not None:
+            if sum(raw.count(sep) for sep in _QS_SEPARATORS) >= max_pairs:
+                raise TooManyParameters("number of querystring parameters", max_pairs)
+
+        if type(self) is Querystring:
+            self.__class__ = UnparsedQuerystring
+        else:
+            # Subclasses are parsed right away
+            self._parse()
+
+    def _parse(self):
+        raw, errors = self.raw, self._errors
+        if '%' not in raw and '+' not in raw and ';' not in raw:
+            # Fast path, there's nothing to unquote
+            as_dict = {}
+            for field in raw.split('&'):
+                if field:
+                    k, _, v = field.partition('=')
+                    as_dict.setdefault(k, []).append(v)
+            Mapping.__init__(self, as_dict)
+            return
+
         # urllib needs bytestrings in py2 and unicode strings in py3
         raw_str = raw.encode('ascii') if PY2 else raw
 
-        self.decoded = _decode(unquote_plus(raw_str), errors=errors)
-        self.raw = raw
-
         common_kw = dict(keep_blank_values=True, strict_parsing=False)
         if PY2:
             # in python 2 parse_qs does its own unquote_plus'ing ...
@@ -93,10 +227,114 @@ class Querystring(Mapping):
             # ... but doesn't decode to unicode.
             for k, vals in list(as_dict.items()):
                 as_dict[_decode(k, errors=errors)] = [
-                    _decode(v, errors=errors) for v in vals
+                    _decode(val, errors=errors) for val in vals
                 ]
         else:
             # in python 3 parse_qs does the decoding
             as_dict = parse_qs(raw_str, errors=errors, **common_kw)
 
         Mapping.__init__(self, as_dict)
+
+    @property
+    def decoded(self):
+        """The unquoted querystring, computed on first access.
+        """
+        if self._decoded is None:
+            # urllib needs bytestrings in py2 and unicode strings in py3
+            raw_str = self.raw.encode('ascii') if PY2 else self.raw
+            self._decoded = _decode(unquote_plus(raw_str), errors=self._errors)
+        return self._decoded
+
+    @decoded.setter
+    def decoded(self, decoded):
+        self._decoded = decoded
+
+
+class UnparsedQuerystring(Querystring):
+    """A :class:`Querystring` that hasn't been parsed yet.
+
+    Calling any of its mapping methods parses it and turns it into a plain
+    Querystring, so that there's no overhead once it has been parsed.
+    """
+
+    def _parse(self):
+        Querystring._parse(self)
+        self.__class__ = Querystring
+
+
+def _parse_first(name):
+    def method(self, *args, **kw):
+        self._parse()
+        for arg in args:
+            # e.g. qs1 == qs2, dict.__eq__ reads the storage of qs2 directly
+            if isinstance(arg, UnparsedQuerystring):
+                arg._parse()
+        return getattr(self, name)(*args, **kw)
+    return method
+
+for _name in ( '__contains__', '__delitem__', '__eq__', '__ge__', '__getitem__', '__gt__'
+             , '__ior__', '__iter__', '__le__', '__len__', '__lt__', '__ne__', '__or__'
+             , '__repr__', '__reversed__', '__ror__', '__setitem__'
+             , 'add', 'all', 'clear', 'copy', 'get', 'has_key', 'items', 'iteritems'
+             , 'iterkeys', 'itervalues', 'keys', 'one', 'ones', 'pop', 'popall', 'popitem'
+             , 'setdefault', 'update', 'values', 'viewitems', 'viewkeys', 'viewvalues'
+              ):
+    if hasattr(Querystring, _name):
+        setattr(UnparsedQuerystring, _name, _parse_first(_name))
+del _name
+
+
+_DIGITS = re.compile(r'[0-9]+\Z')
+
+
+def parse_byte_ranges(header, size, max_ranges=None):
+    """Given the value of a Range header and the size of a file, return a
+    list of ``(first, last)`` byte positions, inclusive, as per RFC 7233.
+
+    None is returned if the header should be ignored, i.e. if it's malformed,
+    if its unit isn't ``bytes``, or if it has more than max_ranges ranges.
+    RangeNotSatisfiable is raised if none of the ranges overlap the file.
+
+    >>> parse_byte_ranges('bytes=0-99,200-,-50', 1000)
+    [(0, 99), (200, 999), (950, 999)]
+    >>> parse_byte_ranges('bytes=500-2000', 1000)
+    [(500, 999)]
+    >>> parse_byte_ranges('items=0-9', 1000) is None
+    True
+
+    """
+    unit, sep, specs = header.partition('=')
+    if not sep or unit.strip().lower() != 'bytes':
+        return None
+    specs = [spec.strip() for spec in specs.split(',')]
+    specs = [spec for spec in specs if spec]
+    if not specs or max_ranges is not None and len(specs) > max_ranges:
+        return None
+    ranges = []
+    for spec in specs:
+        first, sep, last = spec.partition('-')
+        first, last = first.strip(), last.strip()
+        if not sep:
+            return None
+        if first:
+            if not _DIGITS.match(first) or last and not _DIGITS.match(last):
+                return None
+            first = int(first)
+            if last:
+                last = int(last)
+                if last < first:
+                    return None
+            else:
+                last = size - 1
+            if first < size:
+                ranges.append((first, min(last, size - 1)))
+        else:
+            # A suffix range, e.g. `-500` for the last 500 bytes
+            if not _DIGITS.match(last):
+                return None
+            length = int(last)
+            if length and size:
+                ranges.append((max(size - length, 0), size - 1))
+    if not ranges:
+        raise RangeNotSatisfiable(size)
+    return ranges
@@ -1,36 +1,197 @@
+import codecs
+import os
+from email.utils import mktime_tz, parsedate_tz
+from uuid import uuid4
+
 import mimeparse
-import mimetypes
 
+from .request import parse_byte_ranges
 from ..exceptions import NegotiationFailure, NotFound
 from ..output import Output
+from ..utils import LRUCache
+
+
+#: Marks an attribute that hasn't been computed yet.
+NOT_COMPUTED = object()
+
+
+def if_range_matches(if_range_header, mtime):
+    """Given the value of an If-Range header and the modification time of a
+    file, return a boolean.
+
+    We don't generate entity tags, so only dates can match.
+    """
+    if if_range_header.startswith(('"', 'W/')):
+        return False
+    date = parsedate_tz(if_range_header)
+    return date is not None and mktime_tz(date) == int(mtime)
 
 
 class Static(object):
     """Model a static HTTP resource.
+
+    The content of the file is only kept if ``store_static_files_in_ram`` is
+    on, in that case `raw` must be the bytes of the file, otherwise it can be
+    None.
+
+    If ``zero_copy_static_files`` is on and the file isn't kept in RAM, the
+    :class:`~aspen.output.Output` returned by :meth:`render` doesn't have a
+    body, it points to the file instead (see :attr:`~aspen.output.Output.fspath`).
+
+    Byte ranges are served if the state has a ``range_header`` (and optionally
+    an ``if_range_header``), see :meth:`render_ranges`.
     """
 
+    #: The number of bytes to read at a time when checking the charset.
+    charset_check_chunk_size = 65536
+    #: The maximum number of chunks checked, None means the whole file.
+    charset_check_max_chunks = 16
+
+    #: The maximum number of ranges in a Range header, beyond which it's ignored.
+    max_ranges = 16
+
     def __init__(self, request_processor, fspath, raw, fs_media_type):
-        assert type(raw) is bytes  # sanity check
+        assert raw is None or type(raw) is bytes  # sanity check
         self.fspath = fspath
         self.raw = raw if request_processor.store_static_files_in_ram else None
         self.fs_media_type = fs_media_type
         self.media_type = fs_media_type or request_processor.media_type_default
-        self.charset = None
-        if request_processor.charset_static:
-            try:
-                raw.decode(request_processor.charset_static)
-                self.charset = request_processor.charset_static
-            except UnicodeDecodeError:
-                pass
+        self.charset_static = request_processor.charset_static
+        self.zero_copy = request_processor.zero_copy_static_files
+        self._charset = NOT_COMPUTED if self.charset_static else None
+
+    @property
+    def charset(self):
+        """The ``charset_static`` if the file is valid in it, otherwise None.
+
+        This is checked on first access, by decoding the beginning of the file
+        incrementally, up to :attr:`charset_check_max_chunks` chunks of
+        :attr:`charset_check_chunk_size` bytes (1MiB by default). That bounds
+        the cost of the first request to a large file, at the price of
+        declaring the charset of a file that turns out to be invalid beyond
+        the sampled prefix. Set :attr:`charset_check_max_chunks` to None to
+        check whole files.
+        """
+        charset = self._charset
+        if charset is NOT_COMPUTED:
+            charset = self._charset = self._check_charset(self.charset_static, self.raw)
+        return charset
+
+    @charset.setter
+    def charset(self, charset):
+        self._charset = charset
+
+    def _check_charset(self, charset, raw=None):
+        decoder = codecs.getincrementaldecoder(charset)()
+        size, max_chunks = self.charset_check_chunk_size, self.charset_check_max_chunks
+        try:
+            if raw is not None:
+                if max_chunks is None or len(raw) <= size * max_chunks:
+                    decoder.decode(raw, True)
+                else:
+                    # A multibyte sequence may be cut at the end of the sample
+                    decoder.decode(raw[:size * max_chunks])
+            else:
+                with open(self.fspath, 'rb') as f:
+                    n = 0
+                    for chunk in iter(lambda: f.read(size), b''):
+                        if max_chunks is not None and n == max_chunks:
+                            break
+                        decoder.decode(chunk)
+                        n += 1
+                    else:
+                        decoder.decode(b'', True)
+        except UnicodeDecodeError:
+            return None
+        return charset
 
     def render(self, context):
-        output = Output(media_type=self.media_type, charset=self.charset)
-        if self.raw is None:
+        range_header = context.get('range_header')
+        if range_header:
+            output = self.render_ranges(range_header, context.get('if_range_header'))
+            if output is not None:
+                return output
+        if self.raw is not None:
+            body = self.raw
+        elif self.zero_copy:
+            # Let the host framework send the file, the charset check only
+            # reads the beginning of it (see the `charset` property)
+            return Output( media_type=self.media_type
+                         , charset=self.charset
+                         , fspath=self.fspath
+                         , length=os.path.getsize(self.fspath)
+                          )
+        else:
             with open(self.fspath, 'rb') as f:
-                output.body = f.read()
+                body = f.read()
+        charset = self._charset
+        if charset is NOT_COMPUTED:
+            # We have the bytes at hand, don't read the file again
+            charset = self._charset = self._check_charset(self.charset_static, body)
+        return Output(media_type=self.media_type, charset=charset, body=body)
+
+    def render_ranges(self, range_header, if_range_header=None):
+        """Return an Output for the byte ranges requested by a client, or None
+        if the whole file should be sent instead.
+
+        Only the requested spans are read, or none at all if a single range is
+        requested in zero-copy mode (apart from the bounded charset check, see
+        the `charset` property). Multiple ranges are returned as a
+        ``multipart/byteranges`` body. RangeNotSatisfiable is raised if none
+        of the ranges overlap the file.
+        """
+        if self.raw is None or if_range_header:
+            stat = os.stat(self.fspath)
+            if if_range_header and not if_range_matches(if_range_header, stat.st_mtime):
+                return None
+        size = len(self.raw) if self.raw is not None else stat.st_size
+        ranges = parse_byte_ranges(range_header, size, self.max_ranges)
+        if ranges is None:
+            return None
+
+        if len(ranges) == 1:
+            first, last = ranges[0]
+            output = Output( media_type=self.media_type
+                           , charset=self.charset
+                           , ranges=ranges
+                           , content_range='bytes %d-%d/%d' % (first, last, size)
+                            )
+            if self.raw is not None:
+                output.body = self.raw[first:last+1]
+            elif self.zero_copy:
+                output.fspath, output.offset, output.length = self.fspath, first, last - first + 1
+            else:
+                output.body = self._read_spans(ranges)[0]
+            return output
+
+        boundary = uuid4().hex
+        content_type = self.media_type
+        if self.charset:
+            content_type += '; charset=' + self.charset
+        if self.raw is not None:
+            spans = [self.raw[start:end+1] for start, end in ranges]
         else:
-            output.body = self.raw
-        return output
+            spans = self._read_spans(ranges)
+        parts = []
+        for (first, last), span in zip(ranges, spans):
+            parts.append((
+                '\r\n--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n' %
+                (boundary, content_type, first, last, size)
+            ).encode('ascii'))
+            parts.append(span)
+        parts.append(('\r\n--%s--\r\n' % boundary).encode('ascii'))
+        return Output( media_type='multipart/byteranges; boundary=' + boundary
+                     , body=b''.join(parts)
+                     , ranges=ranges
+                      )
+
+    def _read_spans(self, ranges):
+        spans = []
+        with open(self.fspath, 'rb') as f:
+            for first, last in ranges:
+                f.seek(first)
+                spans.append(f.read(last - first + 1))
+        return spans
 
 
 class Dynamic(object):
@@ -39,12 +200,23 @@ class Dynamic(object):
 
     available_types = []  # populate in your subclass
 
+    #: The maximum number of negotiation outcomes to remember per resource.
+    negotiation_cache_size = 64
+    _negotiation_cache = None
+
     def render(self, state):
         """Render the resource with the given state as context, return Output.
 
         Before rendering we need to determine what type of content we're going
-        to send back, by trying to find a match between the media types the
-        client wants and the ones provided by the resource.
+        to send back, see :meth:`negotiate`.
+        """
+        return self.render_for_type(self.negotiate(state), state)
+
+    def negotiate(self, state):
+        """Given the request state, return the media type to render.
+
+        We try to find a match between the media types the client wants and
+        the ones provided by the resource.
 
         The two sources for what the client wants are the extension in the
         request URL, and the Accept header. If the former fails to match we
@@ -53,31 +225,51 @@ class Dynamic(object):
 
         Note that we don't always respect the `Accept` header (the spec says
         we can ignore it: <https://tools.ietf.org/html/rfc7231#section-5.3.2>).
+
+        The outcome only depends on the extension and the Accept header, so
+        it's memoized in a bounded cache (see :attr:`negotiation_cache_size`).
         """
         available = self.available_types
-
         dispatch_extension = state['dispatch_result'].extension
+        if dispatch_extension:
+            accept_header = None
+        elif len(available) == 1:
+            # If there's only one available type and no extension in the path,
+            # then we ignore the Accept header
+            return available[0]
+        else:
+            accept_header = state.get('accept_header')
+
+        cache = self._negotiation_cache
+        if cache is None:
+            cache = self._negotiation_cache = LRUCache(self.negotiation_cache_size)
+        key = (accept_header, dispatch_extension)
+        outcome = cache.get(key)
+        if outcome is None:
+            try:
+                outcome = self._negotiate(accept_header, dispatch_extension)
+            except NegotiationFailure as e:  # NotFound is a subclass
+                outcome = (e.__class__, e.args)
+            cache[key] = outcome
+        if outcome.__class__ is tuple:
+            # a failure, raise a fresh exception
+            cls, args = outcome
+            raise cls(*args)
+        return outcome
+
+    def _negotiate(self, accept_header, dispatch_extension):
+        available = self.available_types
+
         if dispatch_extension:
             # There's an extension in the URI path, guess the media type from it
-            dispatch_accept = mimetypes.guess_type('a.' + dispatch_extension, strict=False)[0]
+            dispatch_accept = self.request_processor.get_accept_for_extension(dispatch_extension)
             if dispatch_accept is None:
                 # The extension is unknown, raise NotFound
                 raise NotFound()
             accept = dispatch_accept
-            # Accept `media/type` for `media/x-type`
-            i = accept.find('/x-')
-            if i > 0:
-                accept += ',' + accept[:i+1] + accept[i+3:]
-            # Accept custom JSON media type
-            if accept == 'application/json':
-                accept += ',' + self.request_processor.media_type_json
-        elif len(available) == 1:
-            # If there's only one available type and no extension in the path,
-            # then we ignore the Accept header
-            return self.render_for_type(available[0], state)
         else:
             dispatch_accept = None
-            accept = state.get('accept_header')
+            accept = accept_header
 
         if accept:
             try:
@@ -86,7 +278,7 @@ class Dynamic(object):
                 # Unparseable accept header
                 best_match = None
             if best_match:
-                return self.render_for_type(best_match, state)
+                return best_match
             elif best_match == '':
                 if dispatch_accept is not None:
                     # e.g. client requested `/foo.json` but `/foo.spt` has no JSON page
@@ -94,4 +286,4 @@ class Dynamic(object):
                 raise NegotiationFailure(accept, available)
 
         # Fall back to the first available type
-        return self.render_for_type(available[0], state)
+        return available[0]
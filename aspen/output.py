@@ -1,9 +1,47 @@
+import io
+
+
 class Output(object):
     body = media_type = charset = None
 
+    #: Instead of a body, an output can point to a span of a file, either by
+    #: path (:attr:`fspath`) or by open file descriptor (:attr:`fd`), so that
+    #: the host framework can hand it to ``os.sendfile`` or ``wsgi.file_wrapper``.
+    fspath = fd = None
+    #: The start of the span, in bytes.
+    offset = 0
+    #: The length of the span, in bytes. None means up to the end of the file.
+    length = None
+
+    #: The list of ``(first, last)`` byte positions served, when the output is
+    #: partial content (``206``) in response to a Range header.
+    ranges = None
+    #: The value of the ``Content-Range`` header, if a single range is served.
+    #: Multiple ranges are served as a ``multipart/byteranges`` body.
+    content_range = None
+
     def __init__(self, **kw):
         self.__dict__.update(kw)
 
+    @property
+    def is_file(self):
+        """True if the output points to a file instead of having a body.
+        """
+        return self.body is None and (self.fspath is not None or self.fd is not None)
+
+    def read(self):
+        """Return the body, reading it from the file if the output points to one.
+        """
+        if not self.is_file:
+            return self.body
+        if self.fspath is not None:
+            f = io.open(self.fspath, 'rb')
+        else:
+            f = io.open(self.fd, 'rb', closefd=False)
+        with f:
+            f.seek(self.offset)
+            return f.read(-1 if self.length is None else self.length)
+
     @property
     def text(self):
-        return self.body.decode(self.charset) if self.charset else None
+        return self.read().decode(self.charset) if self.charset else None
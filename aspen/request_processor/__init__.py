@@ -25,10 +25,13 @@ from collections import defaultdict
 
 from algorithm import Algorithm
 
-from .dispatcher import UserlandDispatcher
+from . import algorithm as default_algorithm
+from .compiler import CompiledAlgorithm
+from .dispatcher import DispatchStatus, UserlandDispatcher
 from .typecasting import defaults as default_typecasters
 from ..http.resource import Static
 from ..exceptions import ConfigurationError
+from ..utils import LRUCache
 
 
 default_indices = [
@@ -41,15 +44,23 @@ default_indices = [
 KNOBS = {
     'changes_reload': False,
     'charset_static': None,
+    'compile_algorithm': False,
     'dispatcher_class': UserlandDispatcher,
     'encode_output_as': 'UTF-8',
     'indices': default_indices,
+    'json_compact': False,
     'media_type_default': 'text/plain',
     'media_type_json': 'application/json',
+    'path_max_length': 8192,
+    'path_max_params': 64,
+    'path_max_segments': 256,
     'project_root': None,
+    'querystring_max_length': 65536,
+    'querystring_max_pairs': 1000,
     'renderer_default': 'stdlib_percent',
     'store_static_files_in_ram': False,
     'www_root': None,
+    'zero_copy_static_files': False,
 }
 
 
@@ -60,12 +71,20 @@ class RequestProcessor(object):
 
     """
 
+    #: The maximum number of request paths to remember in the static fast lane,
+    #: 0 disables it.
+    static_routes_cache_size = 1024
+
     def __init__(self, **kwargs):
         """Takes configuration in kwargs.
 
         See the :obj:`.KNOBS` global variable for valid keys and default values.
         """
         self.algorithm = Algorithm.from_dotted_name('aspen.request_processor.algorithm')
+        self.compiled_algorithm = CompiledAlgorithm(self.algorithm)
+        self._default_functions = list(self.algorithm.functions)
+        self._static_routes = LRUCache(self.static_routes_cache_size)
+        self._static_routes_tree = None
 
         # Do some base-line configuration.
         # ================================
@@ -75,6 +94,7 @@ class RequestProcessor(object):
         # mimetypes
         aspens_mimetypes = os.path.join(os.path.dirname(__file__), 'mime.types')
         mimetypes.knownfiles += [aspens_mimetypes]
+        mime_types_files = [aspens_mimetypes]
         # mimetypes.init is called below after the user has a turn.
 
         # XXX register codecs here
@@ -125,6 +145,7 @@ class RequestProcessor(object):
             # mime.types
             users_mimetypes = os.path.join(self.project_root, 'mime.types')
             mimetypes.knownfiles += [users_mimetypes]
+            mime_types_files.append(users_mimetypes)
 
             # PYTHONPATH
             sys.path.insert(0, self.project_root)
@@ -170,19 +191,178 @@ class RequestProcessor(object):
         if not mimetypes.inited:
             mimetypes.init()
 
+        # Precompute media types by extension, so that the mimetypes module
+        # stays out of the hot path.
+        self._build_media_type_tables(mime_types_files)
+
 
     def process(self, path, querystring, accept_header, raise_immediately=None, return_after=None,
                 **kw):
         """Given a path, querystring, and Accept header, return a state dict.
+
+        When the ``compile_algorithm`` knob is on, the algorithm is run by
+        :attr:`compiled_algorithm`, see :mod:`aspen.request_processor.compiler`.
+
+        The extra keyword arguments are added to the state. Pass the values of
+        the Range and If-Range headers as ``range_header`` and
+        ``if_range_header`` to get partial content for static files, see
+        :meth:`aspen.http.resource.Static.render_ranges`.
+
+        Requests for static files take a fast lane, see :meth:`process_static`.
+        """
+        static_routes = self.get_static_routes()
+        if static_routes is not None and return_after is None:
+            route = static_routes.get(path)
+            if route is not None:
+                return self.process_static(route, path, querystring, accept_header, **kw)
+
+        algorithm = self.compiled_algorithm if self.compile_algorithm else self.algorithm
+        state = algorithm.run( request_processor=self
+                             , path=path
+                             , querystring=querystring
+                             , accept_header=accept_header
+                             , _raise_immediately=raise_immediately
+                             , _return_after=return_after
+                             , **kw
+                              )
+
+        if static_routes is not None and return_after is None:
+            resource = state.get('resource')
+            if isinstance(resource, Static) and state.get('output') is not None:
+                dispatch_result = state['dispatch_result']
+                if dispatch_result.status == DispatchStatus.okay and not dispatch_result.wildcards:
+                    static_routes[path] = (dispatch_result, resource)
+
+        return state
+
+
+    def get_static_routes(self):
+        """Return the cache of the static fast lane, or None if it's disabled.
+
+        The cache maps raw request paths to the dispatch result and resource of
+        static files. It's disabled when the algorithm has been modified, when
+        ``changes_reload`` is on, when the dispatcher doesn't have a dispatch
+        tree, and when :attr:`static_routes_cache_size` is 0. It's emptied when
+        the dispatch tree is rebuilt.
+        """
+        if self.changes_reload or not self.static_routes_cache_size:
+            return None
+        if self.algorithm.functions != self._default_functions:
+            return None
+        tree = getattr(self.dispatcher, 'tree', None)
+        if tree is None:
+            return None
+        if tree is not self._static_routes_tree:
+            self._static_routes = LRUCache(self.static_routes_cache_size)
+            self._static_routes_tree = tree
+        return self._static_routes
+
+
+    def process_static(self, route, path, querystring, accept_header, **kw):
+        """Process a request for a static file that has already been dispatched.
+
+        This skips dispatching, typecasting, loading and encoding, the state
+        dict has the same keys as the one returned by the full algorithm.
+        """
+        dispatch_result, resource = route
+        state = dict(kw, request_processor=self, accept_header=accept_header)
+        if 'algorithm' not in state:    state['algorithm'] = self.algorithm
+        if 'state' not in state:        state['state'] = state
+        if 'exception' not in state:    state['exception'] = None
+        state.update(default_algorithm.hydrate_path(path, request_processor=self))
+        state.update(default_algorithm.hydrate_querystring(querystring, request_processor=self))
+        state['dispatch_result'] = dispatch_result
+        state['resource'] = resource
+        state['output'] = resource.render(state)
+        return state
+
+
+    def process_async(self, path, querystring, accept_header, raise_immediately=None,
+                      return_after=None, **kw):
+        """Given a path, querystring, and Accept header, return a coroutine that
+        resolves to a state dict.
+
+        This is the :mod:`asyncio` counterpart of :meth:`process`, see
+        :mod:`aspen.request_processor.asyncio_`. It requires Python 3.5+.
+        """
+        from .asyncio_ import run
+        return run( self.algorithm
+                  , request_processor=self
+                  , path=path
+                  , querystring=querystring
+                  , accept_header=accept_header
+                  , _raise_immediately=raise_immediately
+                  , _return_after=return_after
+                  , **kw
+                   )
+
+
+    def _build_media_type_tables(self, mime_types_files):
+        """Fill the :attr:`media_types_by_extension` and :attr:`accept_by_extension` tables.
+
+        The tables cover every extension known to the :mod:`mimetypes` module,
+        plus the ones listed in Aspen's and the project's ``mime.types`` files.
+        """
+        known = {}
+        for filename in mime_types_files:
+            known.update(mimetypes.read_mime_types(filename) or {})
+        # Same precedence as in `mimetypes.guess_type(..., strict=False)`
+        known.update(mimetypes.common_types)
+        known.update(mimetypes.types_map)
+
+        for ext in list(mimetypes.encodings_map) + list(mimetypes.suffix_map):
+            # leave these to `mimetypes.guess_type`
+            known.pop(ext, None)
+
+        media_types = dict((ext[1:], media_type) for ext, media_type in known.items())
+        accepts = media_types.copy()
+        for ext, media_type in media_types.items():
+            if '/x-' in media_type:
+                accepts[ext] = self._make_accept(media_type)
+
+        #: A dict of file extensions (without the dot) to media types.
+        self.media_types_by_extension = media_types
+        #: A dict of file extensions (without the dot) to Accept strings, for
+        #: content negotiation. JSON is handled by :meth:`get_accept_for_extension`.
+        self.accept_by_extension = accepts
+
+
+    def _make_accept(self, media_type):
+        accept = media_type
+        # Accept `media/type` for `media/x-type`
+        i = accept.find('/x-')
+        if i > 0:
+            accept += ',' + accept[:i+1] + accept[i+3:]
+        return accept
+
+
+    def guess_media_type(self, filename):
+        """Given a filename, return a media type, or None if the extension is unknown.
+
+        The media type of JSON files is :attr:`media_type_json`.
+        """
+        media_type = self.media_types_by_extension.get(os.path.splitext(filename)[1][1:])
+        if media_type is None:
+            media_type = mimetypes.guess_type(filename, strict=False)[0]
+        if media_type == 'application/json':
+            media_type = self.media_type_json
+        return media_type
+
+
+    def get_accept_for_extension(self, extension):
+        """Given the extension of a request path, return an Accept string for
+        content negotiation, or None if the extension is unknown.
         """
-        return self.algorithm.run( request_processor=self
-                                 , path=path
-                                 , querystring=querystring
-                                 , accept_header=accept_header
-                                 , _raise_immediately=raise_immediately
-                                 , _return_after=return_after
-                                 , **kw
-                                  )
+        accept = self.accept_by_extension.get(extension)
+        if accept is None:
+            media_type = mimetypes.guess_type('a.' + extension, strict=False)[0]
+            if media_type is None:
+                return None
+            accept = self._make_accept(media_type)
+        if accept == 'application/json':
+            # Accept custom JSON media type
+            accept += ',' + self.media_type_json
+        return accept
 
 
     def is_dynamic(self, fspath):
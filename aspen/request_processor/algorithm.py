@@ -3,18 +3,31 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from six import text_type
+
 from . import typecasting
 from .dispatcher import DispatchStatus
 from .. import resources
 from ..http.request import Path, Querystring
 
 
-def hydrate_path(path):
-    return {'path': Path(path)}
+def hydrate_path(path, request_processor=None):
+    if request_processor is None:
+        return {'path': Path(path)}
+    return {'path': Path( path
+                        , max_length=request_processor.path_max_length
+                        , max_segments=request_processor.path_max_segments
+                        , max_params=request_processor.path_max_params
+                         )}
 
 
-def hydrate_querystring(querystring):
-    return {'querystring': Querystring(querystring)}
+def hydrate_querystring(querystring, request_processor=None):
+    if request_processor is None:
+        return {'querystring': Querystring(querystring)}
+    return {'querystring': Querystring( querystring
+                                      , max_length=request_processor.querystring_max_length
+                                      , max_pairs=request_processor.querystring_max_pairs
+                                       )}
 
 
 def dispatch_path_to_filesystem(request_processor, path):
@@ -25,11 +38,15 @@ def dispatch_path_to_filesystem(request_processor, path):
     return {'dispatch_result': result}
 
 
-def apply_typecasters_to_path(request_processor, path, state):
-    typecasting.apply_typecasters( request_processor.typecasters
-                                 , path
-                                 , state
-                                  )
+def apply_typecasters_to_path(request_processor, path, state, dispatch_result=None):
+    typecasts = getattr(dispatch_result, 'typecasts', None)
+    if typecasts is None:
+        typecasting.apply_typecasters( request_processor.typecasters
+                                     , path
+                                     , state
+                                      )
+    elif typecasts:
+        typecasting.apply_typecasts(typecasts, path, state)
 
 
 def load_resource_from_filesystem(request_processor, dispatch_result):
@@ -43,6 +60,6 @@ def render_resource(state, resource=None):
 
 
 def encode_output(request_processor, output=None):
-    if output and not isinstance(output.body, bytes):
+    if output and isinstance(output.body, text_type):
         output.charset = request_processor.encode_output_as
         output.body = output.body.encode(output.charset)
@@ -0,0 +1,110 @@
+"""
+#########################################
+ :mod:`aspen.request_processor.asyncio_`
+#########################################
+
+This module runs the request processing algorithm as a coroutine, for host
+frameworks based on :mod:`asyncio`. It requires Python 3.5 or later. Simplates
+can ``await`` in their second page.
+
+Blocking filesystem operations (loading a resource that isn't in the cache
+yet, reading a static file that isn't stored in RAM) are run in the event
+loop's default executor.
+
+.. contents::
+    :local:
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+
+from algorithm import FunctionNotFound
+
+from . import algorithm
+from .compiler import _iter_with_previous, _steps, _throw
+from .dispatcher import DispatchStatus
+from .. import resources
+from ..http.resource import Static
+
+
+async def load_resource_from_filesystem(request_processor, dispatch_result):
+    if dispatch_result.match and dispatch_result.status == DispatchStatus.okay:
+        fspath = dispatch_result.match
+        resource = resources.get_cached(request_processor, fspath)
+        if resource is None:
+            loop = asyncio.get_event_loop()
+            resource = await loop.run_in_executor(
+                None, resources.get, request_processor, fspath
+            )
+        return {'resource': resource}
+
+
+async def render_resource(state, resource=None):
+    if resource:
+        return {'output': await render(resource, state)}
+
+
+async def render(resource, state):
+    """Render a resource without blocking the event loop, return Output.
+    """
+    if isinstance(resource, Static):
+        if resource.raw is None:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, resource.render, state)
+        return resource.render(state)
+    if getattr(resource, 'run_every_is_coroutine', False):
+        media_type = resource.negotiate(state)
+        context = resource.make_context(media_type, state)
+        assigned = await resource.run_every_async(context)
+        if assigned:
+            context.update(assigned)
+        return resource.render_page(media_type, context)
+    return resource.render(state)
+
+
+#: Coroutine replacements for the functions of the default algorithm.
+COROUTINES = {
+    algorithm.load_resource_from_filesystem: load_resource_from_filesystem,
+    algorithm.render_resource: render_resource,
+}
+
+
+async def run(algo, _raise_immediately=None, _return_after=None, **state):
+    """Run an :class:`~algorithm.Algorithm` as a coroutine, return the state dict.
+
+    This mirrors :meth:`algorithm.Algorithm.run`, including its exception
+    handling (see :func:`~aspen.request_processor.compiler._steps`), with two
+    differences: the functions listed in :data:`COROUTINES` are replaced by
+    their coroutine counterparts, and the value returned by any function is
+    awaited if it's awaitable.
+    """
+    if _raise_immediately is None:
+        _raise_immediately = algo.default_raise_immediately
+
+    if _return_after is not None:
+        if _return_after not in algo.get_names():
+            raise FunctionNotFound(_return_after)
+
+    if 'algorithm' not in state:    state['algorithm'] = algo
+    if 'state' not in state:        state['state'] = state
+    if 'exception' not in state:    state['exception'] = None
+
+    functions = [COROUTINES.get(f, f) for f in algo.functions]
+    functions_iter = _iter_with_previous(functions, 0)
+    steps = _steps(functions_iter, state, False, _raise_immediately, _return_after, True)
+    try:
+        awaitable = next(steps)
+        while True:
+            try:
+                result = await awaitable
+            except:
+                awaitable = _throw(steps)
+            else:
+                awaitable = steps.send(result)
+    except StopIteration:
+        pass
+    return state
@@ -0,0 +1,242 @@
+"""
+#########################################
+ :mod:`aspen.request_processor.compiler`
+#########################################
+
+This module turns the list of functions of an :class:`~algorithm.Algorithm`
+into a single generated function, which passes the arguments of each function
+directly instead of resolving them through :mod:`dependency_injection` on every
+call. It's used by :class:`~aspen.request_processor.RequestProcessor` when the
+``compile_algorithm`` knob is on.
+
+Only the normal flow is compiled. When a function raises an exception, the
+rest of the algorithm (exception handlers included) is run the same way
+:meth:`algorithm.Algorithm.run` does it, by :func:`_steps`, which is also used
+by :mod:`aspen.request_processor.asyncio_`.
+
+.. contents::
+    :local:
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import inspect
+import sys
+import types
+
+from algorithm import FunctionNotFound
+from dependency_injection import get_signature, resolve_dependencies
+from six import PY2
+
+
+_NO_PREVIOUS = object()
+
+
+def _iter_with_previous(functions, start):
+    prev = functions[start - 1] if start > 0 else _NO_PREVIOUS
+    for o in functions[start:]:
+        yield o, prev
+        prev = o
+
+
+def _throw(generator):
+    """Throw the exception being handled into generator.
+    """
+    if PY2:
+        return generator.throw(*sys.exc_info())
+    return generator.throw(sys.exc_info()[1])
+
+
+def _steps(functions_iter, state, in_except, raise_immediately, return_after, await_results):
+    """This is the loop of :meth:`algorithm.Algorithm.run`, as a generator.
+
+    If `await_results` is True, the awaitables returned by the functions are
+    yielded, and the generator must be sent their results, or thrown the
+    exceptions they raise. Otherwise it doesn't yield anything.
+
+    Like in :meth:`algorithm.Algorithm.run`, the exception handlers are called
+    from inside the ``except:`` block, so they can access ``sys.exc_info``.
+    """
+    for function, prev_func in functions_iter:
+        if return_after is not None and prev_func is not _NO_PREVIOUS:
+            if prev_func.__name__ == return_after:
+                break
+        try:
+            deps = resolve_dependencies(function, state)
+            skip = (
+                # When function wants exception but we don't have it.
+                not in_except and 'exception' in deps.signature.required
+                or
+                # When function doesn't want exception but we have it.
+                in_except and 'exception' not in deps.signature.parameters
+            )
+            if not skip:
+                new_state = function(**deps.as_kwargs)
+                if await_results and inspect.isawaitable(new_state):
+                    new_state = yield new_state
+                if new_state is not None:
+                    state.update(new_state)
+                if in_except and state['exception'] is None:
+                    # exception is cleared, return to normal flow
+                    if PY2:
+                        sys.exc_clear()
+                    return
+        except:
+            if raise_immediately:
+                raise
+            state['exception'] = sys.exc_info()[1]
+            # This is `yield from _steps(...)`, which Python 2 doesn't have
+            handlers = _steps( functions_iter, state, True, raise_immediately, return_after
+                             , await_results
+                              )
+            try:
+                awaitable = next(handlers)
+                while True:
+                    try:
+                        result = yield awaitable
+                    except:
+                        awaitable = _throw(handlers)
+                    else:
+                        awaitable = handlers.send(result)
+            except StopIteration:
+                pass
+            if in_except:
+                # an exception occurred while we were handling another
+                # exception, but now it's been cleared, so we return to
+                # the normal flow
+                return
+    if in_except:
+        raise  # exception hasn't been handled, reraise
+
+
+def _loop(functions_iter, state, in_except, raise_immediately, return_after):
+    """Run :func:`_steps` for functions that don't need to be awaited.
+    """
+    for _ in _steps(functions_iter, state, in_except, raise_immediately, return_after, False):
+        pass
+
+
+def _call_with_dependencies(function, state):
+    return function(**resolve_dependencies(function, state).as_kwargs)
+
+
+TEMPLATE = """\
+def run(state, raise_immediately):
+    try:
+%s
+        return state
+    except:
+        if not has_arguments(step, state):
+            # The function wasn't called, let the generic loop call it
+            resume_at = step
+        elif raise_immediately:
+            raise
+        else:
+            state['exception'] = sys.exc_info()[1]
+            functions_iter = iter_with_previous(functions, step + 1)
+            loop(functions_iter, state, True, raise_immediately, return_after)
+            resume_at = None
+    if resume_at is not None:
+        functions_iter = iter_with_previous(functions, resume_at)
+    loop(functions_iter, state, False, raise_immediately, return_after)
+    return state
+"""
+
+
+def compile_functions(functions, return_after=None):
+    """Given a list of functions, return a function that runs them.
+
+    The returned function takes the state dict and a ``raise_immediately``
+    boolean, and returns the state dict.
+    """
+    namespace = { 'sys': sys
+                , 'functions': functions
+                , 'return_after': return_after
+                , 'iter_with_previous': _iter_with_previous
+                , 'loop': _loop
+                , 'call_with_dependencies': _call_with_dependencies
+                 }
+    required_by_step = {}
+    lines = []
+    for i, function in enumerate(functions):
+        signature = get_signature(function)
+        if 'exception' not in signature.required:
+            name = 'f%d' % i
+            namespace[name] = function
+            if isinstance(function, types.FunctionType):
+                args = []
+                for param in signature.parameters:
+                    if param in signature.optional:
+                        default = 'd%d_%s' % (i, param)
+                        namespace[default] = signature.optional[param]
+                        args.append('%s=state.get(%r, %s)' % (param, str(param), default))
+                    else:
+                        args.append('%s=state[%r]' % (param, str(param)))
+                required_by_step[i] = signature.required
+                call = '%s(%s)' % (name, ', '.join(args))
+            else:
+                call = 'call_with_dependencies(%s, state)' % name
+            lines.append('step = %d' % i)
+            lines.append('new_state = %s' % call)
+            lines.append('if new_state is not None:')
+            lines.append('    state.update(new_state)')
+        if return_after is not None and function.__name__ == return_after:
+            break
+
+    def has_arguments(step, state):
+        for name in required_by_step.get(step, ()):
+            if name not in state:
+                return False
+        return True
+    namespace['has_arguments'] = has_arguments
+
+    body = '\n'.join('        ' + line for line in lines) or '        pass'
+    code = compile(TEMPLATE % body, '<compiled algorithm>', 'exec')
+    exec(code, namespace)
+    return namespace['run']
+
+
+class CompiledAlgorithm(object):
+    """Run an :class:`~algorithm.Algorithm` through generated functions.
+
+    The functions are generated on first use, and again whenever the list of
+    functions of the algorithm changes.
+    """
+
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self._functions = None
+        self._compiled = {}
+
+    def get_compiled(self, return_after=None):
+        """Return the generated function for `return_after`.
+        """
+        functions = self.algorithm.functions
+        if self._functions != functions:
+            self._functions = list(functions)
+            self._compiled = {}
+        compiled = self._compiled.get(return_after)
+        if compiled is None:
+            if return_after is not None:
+                if return_after not in self.algorithm.get_names():
+                    raise FunctionNotFound(return_after)
+            compiled = compile_functions(self._functions, return_after)
+            self._compiled[return_after] = compiled
+        return compiled
+
+    def run(self, _raise_immediately=None, _return_after=None, **state):
+        """Mirror :meth:`algorithm.Algorithm.run`.
+        """
+        if _raise_immediately is None:
+            _raise_immediately = self.algorithm.default_raise_immediately
+
+        compiled = self.get_compiled(_return_after)
+
+        if 'algorithm' not in state:    state['algorithm'] = self.algorithm
+        if 'state' not in state:        state['state'] = state
+        if 'exception' not in state:    state['exception'] = None
+
+        return compiled(state, _raise_immediately)
@@ -8,6 +8,7 @@ from functools import reduce
 import os
 import posixpath
 
+from . import typecasting
 from ..exceptions import SlugCollision, WildcardCollision
 
 from ..utils import Constant
@@ -58,19 +59,22 @@ class DispatchStatus(object):
     unindexed = Constant('unindexed')
 
 
-DispatchResult = namedtuple('DispatchResult', 'status match wildcards extension canonical')
+DispatchResult = namedtuple('DispatchResult', 'status match wildcards extension canonical typecasts')
+DispatchResult.__new__.__defaults__ = (None,)
 """
     status - A DispatchStatus constant encoding the overall result
     match - the matching path (if status != 'missing')
     wildcards - a dict whose keys are wildcard names, and values are as supplied by the path
     extension - e.g. `json` when `foo.spt` is matched to `foo.json`
     canonical - the canonical path of the resource, e.g. `/` for `/index.html`
+    typecasts - a list of `(wildcard, varname, typecaster)` tuples for the typed
+                wildcards, or None if the dispatcher doesn't precompute them
 """
 
 MISSING = DispatchResult(DispatchStatus.missing, None, None, None, None)
 
 
-Node = namedtuple('Node', 'fspath type wildcard extension files dirs')
+Node = namedtuple('Node', 'fspath type wildcard extension files dirs typecast validator')
 """
     fspath - absolute filesystem path of this node
     type - 'directory', 'dynamic', or 'static'
@@ -78,6 +82,8 @@ Node = namedtuple('Node', 'fspath type wildcard extension files dirs')
     extension - the sub-extension of a dynamic file, e.g. `json` for `foo.json.spt`
     files - a `dict` of the node's leaf children
     dirs - a `dict` of the node's directory children
+    typecast - a `(wildcard, varname, typecaster)` tuple if the wildcard is typed
+    validator - a function that checks the value of a typed wildcard, or None
 """
 
 
@@ -414,17 +420,25 @@ class UserlandDispatcher(Dispatcher):
                     varnames[varname] = dirpath
                     wildcard = '.'.join((varname, vartype)) if vartype else varname
                     del varname, vartype
+                    typecast = self._get_typecast(wildcard)
+                    validator = typecasting.get_validator(typecast[2]) if typecast else None
                     if is_dir:
                         slug = self.DIR_WILDCARD
                     else:
-                        node = Node(fspath, node_type, wildcard, extension, None, None)
+                        node = Node(
+                            fspath, node_type, wildcard, extension, None, None,
+                            typecast, validator
+                        )
                         wildleafs = files.setdefault(self.LEAF_WILDCARDS, {})
                         wildleafs[extension] = node
                         continue
                 else:
-                    wildcard, extension = None, None
+                    wildcard, extension, typecast, validator = None, None, None, None
                 subtree = f(fspath, varnames.copy()) if is_dir else (None, None)
-                node = Node(fspath, node_type, wildcard, extension, *subtree)
+                node = Node(
+                    fspath, node_type, wildcard, extension, subtree[0], subtree[1],
+                    typecast, validator
+                )
                 goes_into = dirs if is_dir else files
                 if slug in goes_into:
                     action = self.collision_handler(slug, goes_into[slug], node)
@@ -442,7 +456,17 @@ class UserlandDispatcher(Dispatcher):
             return files, dirs
 
         files, dirs = f(self.www_root, {})
-        self.tree = Node(self.www_root, 'directory', None, None, files, dirs)
+        self.tree = Node(self.www_root, 'directory', None, None, files, dirs, None, None)
+
+    def _get_typecast(self, wildcard):
+        """Given the name of a wildcard, return a typecast tuple or None.
+        """
+        pieces = wildcard.rsplit('.', 1)
+        if len(pieces) > 1:
+            varname, vartype = pieces
+            if vartype in self.typecasters:
+                return (wildcard, varname, self.typecasters[vartype])
+        return None
 
     def dispatch(self, path, path_segments):
         DIR_WILDCARD = self.DIR_WILDCARD
@@ -450,26 +474,35 @@ class UserlandDispatcher(Dispatcher):
 
         extension, canonical = None, None
         fallback_wildleafs = {}
+        typecasts = []
 
         def fallback():
             if fallback_wildleafs:
                 requested_extension = splitext(path_segments[-1])[1]
-                if requested_extension in fallback_wildleafs:
-                    node = fallback_wildleafs[requested_extension]
-                elif None in fallback_wildleafs:
-                    node = fallback_wildleafs[None]
-                else:
-                    debug("no suitable wildleaf fallback")
-                    return DispatchResult(DispatchStatus.missing, None, wildcards, None, None)
-                debug("falling back to wild leaf: %r", (node,))
                 tail = '/'.join(path_segments[depth:])
-                if node.extension:
-                    wildcards[node.wildcard] = tail[:-len(node.extension)-1]
-                else:
-                    wildcards[node.wildcard] = tail
-                return DispatchResult(DispatchStatus.okay, node.fspath, wildcards, None, None)
+                for ext in (requested_extension, None):
+                    node = fallback_wildleafs.get(ext)
+                    if node is None:
+                        continue
+                    value = tail[:-len(node.extension)-1] if node.extension else tail
+                    if node.validator and not node.validator(value):
+                        debug("invalid value for wild leaf: %r", (node,))
+                        continue
+                    debug("falling back to wild leaf: %r", (node,))
+                    wildcards[node.wildcard] = value
+                    if node.typecast:
+                        typecasts.append(node.typecast)
+                    return DispatchResult(
+                        DispatchStatus.okay, node.fspath, wildcards, None, None, typecasts
+                    )
+                debug("no suitable wildleaf fallback")
+                return DispatchResult(
+                    DispatchStatus.missing, None, wildcards, None, None, typecasts
+                )
             debug("no wildleaf fallback")
-            return DispatchResult(DispatchStatus.missing, None, wildcards, None, canonical)
+            return DispatchResult(
+                DispatchStatus.missing, None, wildcards, None, canonical, typecasts
+            )
 
         wildcards = {}
         node = self.tree
@@ -520,14 +553,27 @@ class UserlandDispatcher(Dispatcher):
                 if segment == '':
                     # Legacy behavior: dispatch to the "first" wildleaf
                     node = fallback_wildleafs[min(fallback_wildleafs)]
+                    if node.validator and not node.validator(segment):
+                        debug("invalid value for wild leaf: %r", (node,))
+                        return DispatchResult(
+                            DispatchStatus.missing, None, wildcards, None, None, typecasts
+                        )
                     wildcards[node.wildcard] = segment
-                    return DispatchResult(DispatchStatus.okay, node.fspath, wildcards, None, None)
+                    if node.typecast:
+                        typecasts.append(node.typecast)
+                    return DispatchResult(
+                        DispatchStatus.okay, node.fspath, wildcards, None, None, typecasts
+                    )
                 if depth == max_depth:
                     return fallback()
-            if DIR_WILDCARD in dirs:
+            if DIR_WILDCARD in dirs and (
+                dirs[DIR_WILDCARD].validator is None or dirs[DIR_WILDCARD].validator(segment)
+            ):
                 node = dirs[DIR_WILDCARD]
                 debug("directory wildcard match: %r", node.wildcard)
                 wildcards[node.wildcard] = segment
+                if node.typecast:
+                    typecasts.append(node.typecast)
                 continue
             if depth == max_depth and node.type == 'directory' and segment == '':
                 break
@@ -546,7 +592,9 @@ class UserlandDispatcher(Dispatcher):
             else:
                 fspath = node.fspath + os.path.sep
                 return DispatchResult(
-                    DispatchStatus.unindexed, fspath, wildcards, extension, canonical
+                    DispatchStatus.unindexed, fspath, wildcards, extension, canonical, typecasts
                 )
 
-        return DispatchResult(DispatchStatus.okay, node.fspath, wildcards, extension, canonical)
+        return DispatchResult(
+            DispatchStatus.okay, node.fspath, wildcards, extension, canonical, typecasts
+        )
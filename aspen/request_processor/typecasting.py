@@ -3,7 +3,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import re
+import time
+
 from ..exceptions import TypecastError
+from ..utils import LRUCache
 
 
 """
@@ -12,10 +16,44 @@ from ..exceptions import TypecastError
    argument, but may return any value.  If they raise an error, the
    typecasted key (the one without the suffix) will not be set, and
    a TypecastError will be thrown.
+
+   A typecaster can also have a `validator` attribute, which is either a
+   compiled regex that has to match the whole value, or a function that
+   takes the value and returns a boolean. The dispatcher checks it while
+   walking the tree, and treats a path with an invalid value as not matching
+   the typed wildcard. A validator is only a fast filter: it can let through
+   values that the typecaster rejects, but it must not reject values that the
+   typecaster accepts.
 """
 
-defaults = { 'int': lambda pathpart, state: int(pathpart)
-           , 'float': lambda pathpart, state: float(pathpart)
+def with_validator(validator, typecaster):
+    """Attach a validator to a typecaster, and return the typecaster.
+    """
+    typecaster.validator = validator
+    return typecaster
+
+
+def get_validator(typecaster):
+    """Return the validator of a typecaster as a predicate function, or None.
+    """
+    validator = getattr(typecaster, 'validator', None)
+    if validator is None or not hasattr(validator, 'match'):
+        return validator
+    match = validator.match
+    def predicate(value):
+        m = match(value)
+        return m is not None and m.end() == len(value)
+    return predicate
+
+
+INT_RE = re.compile(r'\s*[-+]?\d[\d_]*\s*', re.UNICODE)
+FLOAT_RE = re.compile(
+    r'\s*[-+]?(?:(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:e[-+]?\d[\d_]*)?|inf(?:inity)?|nan)\s*',
+    re.IGNORECASE | re.UNICODE
+)
+
+defaults = { 'int': with_validator(INT_RE, lambda pathpart, state: int(pathpart))
+           , 'float': with_validator(FLOAT_RE, lambda pathpart, state: float(pathpart))
             }
 
 def apply_typecasters(typecasters, path, state):
@@ -38,3 +76,86 @@ def apply_typecasters(typecasters, path, state):
                 except:
                     raise TypecastError(ext)
 
+
+def apply_typecasts(typecasts, path, state):
+    """Perform precomputed typecasts (in-place!) on the supplied path Mapping.
+       The typecasts are (key, var, typecaster) tuples, as computed by the
+       dispatcher when it builds its tree. The effect is the same as
+       apply_typecasters, without looking at the other keys of the path.
+    """
+    for part, var, typecaster in typecasts:
+        if part not in path:
+            continue
+        try:
+            for v in path.all(part):
+                path.add(var, typecaster(v, state))
+            path.popall(part)
+        except:
+            raise TypecastError(part.rsplit('.', 1)[1])
+
+
+class MemoizedTypecaster(object):
+    """Wrap a typecaster in a bounded memo with expiring entries.
+
+    :param typecaster: the typecasting function to wrap
+    :param int maxsize: the maximum number of values to remember
+    :param ttl: the number of seconds a value is remembered for, or None to
+        keep values until they're evicted or invalidated
+
+    The memo is keyed on the raw path part only, so the wrapped typecaster
+    shouldn't depend on the `state` it's passed. Errors aren't memoized. The
+    validator of the wrapped typecaster, if any, is kept.
+
+    >>> calls = []
+    >>> def to_user(pathpart, state):
+    ...     calls.append(pathpart)
+    ...     return pathpart.title()
+    >>> typecaster = MemoizedTypecaster(to_user, maxsize=100, ttl=60)
+    >>> typecaster('alice', {}) == typecaster('alice', {}) == 'Alice'
+    True
+    >>> len(calls), typecaster.hits, typecaster.misses
+    (1, 1, 1)
+    >>> typecaster.invalidate('alice')
+    >>> typecaster('alice', {}) == 'Alice'
+    True
+    >>> len(calls)
+    2
+
+    """
+
+    clock = staticmethod(getattr(time, 'monotonic', time.time))
+
+    def __init__(self, typecaster, maxsize=1024, ttl=None):
+        self.typecaster = typecaster
+        self.ttl = ttl
+        self.validator = getattr(typecaster, 'validator', None)
+        self.hits = 0
+        self.misses = 0
+        self._cache = LRUCache(maxsize)
+
+    def __call__(self, pathpart, state):
+        entry = self._cache.get(pathpart)
+        if entry is not None:
+            value, expires = entry
+            if expires is None or expires > self.clock():
+                self.hits += 1
+                return value
+        self.misses += 1
+        value = self.typecaster(pathpart, state)
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        self._cache[pathpart] = (value, expires)
+        return value
+
+    def __len__(self):
+        return len(self._cache)
+
+    def invalidate(self, pathpart):
+        """Forget the value for a path part, e.g. after it's been modified.
+        """
+        self._cache.pop(pathpart)
+
+    def clear(self):
+        """Forget all the values, and reset the counters.
+        """
+        self._cache.clear()
+        self.hits = self.misses = 0
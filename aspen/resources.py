@@ -3,7 +3,6 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import mimetypes
 import os
 import stat
 
@@ -49,6 +48,17 @@ def get(request_processor, fspath):
     return entry.resource
 
 
+def get_cached(request_processor, fspath):
+    """Given a RequestProcessor and a filesystem path, return a cached Resource
+    object, or None if getting the resource requires touching the filesystem.
+    """
+    if not request_processor.changes_reload:
+        entry = __cache__.get(fspath)
+        if entry:
+            return entry.resource
+    return None
+
+
 def load(request_processor, fspath):
     """Given a RequestProcessor and a filesystem path, return a Resource object (w/o caching).
     """
@@ -59,10 +69,13 @@ def load(request_processor, fspath):
     # ===========
     # Dynamic files are loaded according to their encoding and turned into
     # unicode strings internally. Static files might be binary, so we don't
-    # decode them.
+    # decode them, and we only read them if they're going to be kept in RAM.
 
-    with open(fspath, 'rb') as fh:
-        raw = fh.read()
+    if Class is Static and not request_processor.store_static_files_in_ram:
+        raw = None
+    else:
+        with open(fspath, 'rb') as fh:
+            raw = fh.read()
 
     # Compute a media type.
     # =====================
@@ -71,9 +84,7 @@ def load(request_processor, fspath):
     guess_with = fspath
     if Class is not Static:
         guess_with = guess_with.rsplit('.', 1)[0]
-    fs_media_type = mimetypes.guess_type(guess_with, strict=False)[0]
-    if fs_media_type == 'application/json':
-        fs_media_type = request_processor.media_type_json
+    fs_media_type = request_processor.guess_media_type(guess_with)
 
     # Compute and instantiate a class.
     # ================================
@@ -3,7 +3,16 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from collections import deque
 import datetime
+from inspect import getmro
+
+from six.moves import range
+
+try:
+    from collections.abc import Iterator
+except ImportError:
+    from collections import Iterator
 
 
 # Find a json module.
@@ -33,20 +42,43 @@ except ImportError:
 # decoding that doesn't depend on dumps. And this is that way:
 
 encoders = {}
+_encoders_by_class = {}  # memo for get_encoder, cleared when encoders change
+
 def register_encoder(cls, encode):
     """Register the encode function for cls.
 
     An encoder should take an instance of cls and return something basically
-    serializable (strings, lists, dictionaries).
+    serializable (strings, lists, dictionaries). It's also used for the
+    subclasses of cls that don't have an encoder of their own.
 
     """
     encoders[cls] = encode
+    _encoders_by_class.clear()
 
 def unregister_encoder(cls):
     """Given a class, remove any encoder that has been registered for it.
     """
     if cls in encoders:
         del encoders[cls]
+    _encoders_by_class.clear()
+
+def get_encoder(cls):
+    """Return the encoder registered for cls or its nearest base class, or None.
+
+    The result is memoized per class.
+
+    """
+    try:
+        return _encoders_by_class[cls]
+    except KeyError:
+        pass
+    encode = None
+    for base in getmro(cls):
+        if base in encoders:
+            encode = encoders[base]
+            break
+    _encoders_by_class[cls] = encode
+    return encode
 
 # http://docs.python.org/library/json.html
 register_encoder(complex, lambda obj: [obj.real, obj.imag])
@@ -56,6 +88,13 @@ register_encoder(datetime.datetime, lambda obj: obj.isoformat())
 register_encoder(datetime.date, lambda obj: obj.isoformat())
 register_encoder(datetime.time, lambda obj: obj.isoformat())
 
+# Containers that aren't lists, but are encoded as arrays.
+for cls in (set, frozenset, deque, range, type({}.keys()), type({}.values()),
+            type({}.items())):
+    if cls is not list:  # dict methods return lists in Python 2
+        register_encoder(cls, list)
+del cls
+
 
 # Be lazy.
 # ========
@@ -70,9 +109,47 @@ if _json is not None:
             cls = obj.__class__ # Use this instead of type(obj) because that
                                 # isn't consistent between new- and old-style
                                 # classes, and this is.
-            encode = encoders.get(cls, super(FriendlyEncoder, self).default)
+            try:
+                encode = _encoders_by_class[cls]
+            except KeyError:
+                encode = get_encoder(cls)
+            if encode is None:
+                return super(FriendlyEncoder, self).default(obj)
             return encode(obj)
 
+    class _Stream(list):
+        """Make an iterator look like a list to the pure-Python encoder, without
+        consuming it in advance.
+        """
+        def __init__(self, iterator):
+            self._iterator = iterator
+            self._head = []
+            for o in iterator:
+                self._head.append(o)
+                break
+
+        def __bool__(self):
+            return bool(self._head)
+        __nonzero__ = __bool__
+
+        def __iter__(self):
+            for o in self._head:
+                yield o
+            for o in self._iterator:
+                yield o
+
+    class StreamingEncoder(FriendlyEncoder):
+        """Encode iterators (e.g. generators) as arrays, lazily.
+
+        This only works with :meth:`iterencode`, which is what
+        :func:`iterdumps` uses.
+
+        """
+        def default(self, obj):
+            if isinstance(obj, Iterator):
+                return _Stream(obj)
+            return super(StreamingEncoder, self).default(obj)
+
 def lazy_check():
     if _json is None:
         raise ImportError("Neither simplejson nor json was found. Try "
@@ -113,3 +190,42 @@ def dumps(*a, **kw):
         kw['indent'] = 4
     return _json.dumps(*a, **kw)
 
+
+def compact_encoder():
+    """Return a function that encodes an object to compact, unsorted JSON.
+
+    Unlike :func:`dumps`, the output isn't indented, so the C speedups of the
+    json module are used. The registered encoders are still honored.
+
+    """
+    lazy_check()
+    return FriendlyEncoder(separators=(',', ':')).encode
+
+def streaming_encoder(compact=False):
+    """Return a :class:`StreamingEncoder`, configured like :func:`dumps` or,
+    if `compact` is true, like :func:`compact_encoder`.
+    """
+    lazy_check()
+    if compact:
+        return StreamingEncoder(separators=(',', ':'))
+    return StreamingEncoder(sort_keys=True, indent=4)
+
+def iterdumps(obj, encoder=None, charset='ascii', chunk_size=65536):
+    """Encode obj to JSON, yield the output as bytestrings of about chunk_size.
+
+    Iterators in obj (e.g. generators) are encoded as arrays, and consumed
+    while the output is being generated, so that the whole output doesn't
+    have to be in memory at once.
+
+    """
+    if encoder is None:
+        encoder = streaming_encoder()
+    buffered, size = [], 0
+    for piece in encoder.iterencode(obj):
+        buffered.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffered).encode(charset)
+            buffered, size = [], 0
+    if buffered:
+        yield ''.join(buffered).encode(charset)
@@ -3,8 +3,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from importlib import import_module
 import sys
-import pkg_resources
+from weakref import WeakValueDictionary
+
+try:
+    from collections.abc import MutableMapping, Sequence
+except ImportError:
+    from collections import MutableMapping, Sequence
 
 # Built-in renderers
 BUILTIN_RENDERERS = [ 'stdlib_format'
@@ -12,36 +18,141 @@ BUILTIN_RENDERERS = [ 'stdlib_format'
                     , 'stdlib_template'
                     , 'json_dump'
                     , 'jsonp_dump'
+                    , 'json_stream'
                      ]
 
-RENDERERS = BUILTIN_RENDERERS[:]
+ENTRY_POINT_GROUP = 'aspen.renderers'
 
-for entrypoint in pkg_resources.iter_entry_points(group='aspen.renderers'):
-    RENDERERS.append(entrypoint.name)
+_entry_points = None
 
-RENDERERS.sort()
+def entry_points():
+    """Return a dict of renderer names to the entry points that provide them.
 
-def factories(configuration):
-    """return a dict of render factory names to the factories themselves"""
-    renderer_factories = {}
-    # import the built-in renderers
-    for name in BUILTIN_RENDERERS:
-        # Pre-populate renderers so we can report on ImportErrors early
+    Entry points are discovered with :mod:`importlib.metadata` (or its
+    backport, or :mod:`pkg_resources` as a last resort) the first time this is
+    called, and the result is cached.
+
+    """
+    global _entry_points
+    if _entry_points is None:
+        _entry_points = dict((ep.name, ep) for ep in _iter_entry_points(ENTRY_POINT_GROUP))
+    return _entry_points
+
+def _iter_entry_points(group):
+    try:
+        from importlib.metadata import entry_points as find_entry_points
+    except ImportError:
         try:
-            capture = {}
-            python_syntax = 'from aspen.simplates.renderers.%s import Factory'
-            exec(python_syntax % name, capture)
-            make_renderer = capture['Factory'](configuration)
+            from importlib_metadata import entry_points as find_entry_points
+        except ImportError:
+            import pkg_resources
+            return pkg_resources.iter_entry_points(group=group)
+    eps = find_entry_points()
+    if hasattr(eps, 'select'):
+        return eps.select(group=group)
+    return eps.get(group, ())
+
+def renderer_names():
+    """Return a sorted list of the names of the available renderers.
+    """
+    return sorted(set(BUILTIN_RENDERERS).union(entry_points()))
+
+
+class RendererNames(Sequence):
+    """A sorted sequence of the names of the available renderers.
+
+    The names are only computed (by :func:`renderer_names`) the first time the
+    sequence is read, so that entry points aren't discovered on import.
+
+    """
+
+    def __init__(self):
+        self._names = None
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = renderer_names()
+        return self._names
+
+    def __getitem__(self, index):
+        return self.names[index]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __eq__(self, other):
+        if isinstance(other, RendererNames):
+            other = other.names
+        return self.names == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.names)
+
+RENDERERS = RendererNames()
+
+
+class RendererFactories(MutableMapping):
+    """A mapping of renderer names to renderer factories.
+
+    The module providing a renderer is only imported the first time the
+    renderer is looked up. If that fails with an ImportError, the exception
+    becomes the value for that name.
+
+    """
+
+    def __init__(self, configuration):
+        self._configuration = configuration
+        self._names = set(BUILTIN_RENDERERS).union(entry_points())
+        self._factories = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._factories[name]
+        except KeyError:
+            if name not in self._names:
+                raise
+        self._factories[name] = make_renderer = self._load(name)
+        return make_renderer
+
+    def _load(self, name):
+        try:
+            ep = entry_points().get(name)
+            if ep is None:
+                render_module = import_module('aspen.simplates.renderers.' + name)
+            else:
+                render_module = ep.load()
+            return render_module.Factory(self._configuration)
         except ImportError as err:
-            make_renderer = err
             err.info = sys.exc_info()
-        renderer_factories[name] = make_renderer
+            return err
+
+    def __setitem__(self, name, make_renderer):
+        self._names.add(name)
+        self._factories[name] = make_renderer
+
+    def __delitem__(self, name):
+        self._names.remove(name)
+        self._factories.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(sorted(self._names))
 
-    # import renderers provided by other packages
-    for entrypoint in pkg_resources.iter_entry_points(group='aspen.renderers'):
-        render_module = entrypoint.load()
-        renderer_factories[entrypoint.name] = render_module.Factory(configuration)
-    return renderer_factories
+    def __len__(self):
+        return len(self._names)
+
+
+def factories(configuration):
+    """return a mapping of render factory names to the factories themselves"""
+    return RendererFactories(configuration)
 
 
 # abstract bases
@@ -61,14 +172,18 @@ class Renderer(object):
         self.media_type = media_type
         self.offset = offset
         self.padded = ('\n' * offset) + self.raw
+        self._strip_padding = True
+        self._meta_version = factory._meta_version
         self.compiled = self.compile(self._filepath, self.padded)
 
     def __call__(self, context):
         if self._changes_reload:
             self.meta = self._factory._update_meta()
-            self.compiled = self.compile(self._filepath, self.padded)
+            if self.needs_recompile():
+                self._meta_version = self._factory._meta_version
+                self.compiled = self.compile(self._filepath, self.padded)
         r = self.render_content(context)
-        if r[:self.offset] == self.padded[:self.offset]:
+        if self._strip_padding and r[:self.offset] == self.padded[:self.offset]:
             # The padding is still there, strip it
             return r[self.offset:]
         return r
@@ -78,12 +193,28 @@ class Renderer(object):
 
         Whatever you return from this will be set on self.compiled the first
         time the renderer is called. If changes_reload is True then this will
-        be called every time the renderer is called. You can then use
+        be called again whenever needs_recompile returns True. You can then use
         self.compiled in your render_content method as needed.
 
+        If what you compile is self.raw rather than the padded content, set
+        self._strip_padding to False, so that the output isn't checked for
+        padding on every call.
+
         """
         return padded
 
+    def needs_recompile(self):
+        """Override. Return True if self.compiled is out of date.
+
+        This is only called when changes_reload is True, before each render.
+        The content page itself can't change (the whole simplate is reloaded
+        when its file is modified), so by default this is True only when the
+        factory's meta has changed. Override it if your compiled templates
+        depend on other things, e.g. included files.
+
+        """
+        return self._meta_version != self._factory._meta_version
+
     def render_content(self, context):
         """Override. Context is a dict.
 
@@ -99,33 +230,75 @@ class Renderer(object):
         """
         return self.raw  # pass-through
 
+    def referenced_names(self):
+        """Override. Return the names that the content page reads from its context.
+
+        The return value is a set of strings, or None if the names can't be
+        determined statically (which is the safe default). Simplates use this
+        to detect content pages whose output doesn't depend on the request.
+
+        """
+        return None
+
 
 class Factory(object):
 
     Renderer = Renderer
 
+    #: If True, identical content pages share one Renderer. This is only safe
+    #: if the renderer doesn't depend on the file path of the simplate.
+    intern_renderers = False
+
     def __init__(self, configuration):
         self._configuration = configuration
         self._changes_reload = configuration.changes_reload
+        self._meta_version = 0
+        self._meta_signature = self.meta_signature(configuration)
+        self._renderers = WeakValueDictionary()
         self.meta = self.compile_meta(configuration)
 
     def __call__(self, filepath, raw, media_type, offset):
         """Given three bytestrings and an int, return a callable.
         """
         self._update_meta()
-        return self.Renderer(self, filepath, raw, media_type, offset)
+        if not self.intern_renderers:
+            return self.Renderer(self, filepath, raw, media_type, offset)
+        key = (media_type, raw, offset)
+        renderer = self._renderers.get(key)
+        if renderer is None:
+            renderer = self.Renderer(self, filepath, raw, media_type, offset)
+            self._renderers[key] = renderer
+        return renderer
 
     def _update_meta(self):
         if self._changes_reload:
-            self.meta = self.compile_meta(self._configuration)
+            signature = self.meta_signature(self._configuration)
+            if signature != self._meta_signature:
+                self._meta_signature = signature
+                self.meta = self.compile_meta(self._configuration)
+                self._meta_version += 1
         return self.meta  # used in our child, Renderer
 
     def compile_meta(self, configuration):
         """Takes a configuration object. Override as needed.
 
         Whatever you return from this will be set on self.meta the first time
-        the factory is called, or every time if changes_reload is True. You can
-        then use self.meta in your Renderer class as needed.
+        the factory is called, or again whenever meta_signature changes if
+        changes_reload is True. You can then use self.meta in your Renderer
+        class as needed.
 
         """
         return None
+
+    def meta_signature(self, configuration):
+        """Override. Return a value that changes when compile_meta needs to run again.
+
+        This is only used when changes_reload is True. The default is a shallow
+        copy of the configuration's attributes, so compile_meta runs again
+        whenever a configuration value is replaced. Return None to disable
+        recompilation entirely.
+
+        """
+        if not self._changes_reload:
+            return None
+        return dict(getattr(configuration, '__dict__', {}))
@@ -3,21 +3,69 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import ast
+
+from six import integer_types, string_types, text_type
+
 from . import Renderer, Factory
 from .. import json_
 
+
+SCALAR_TYPES = integer_types + string_types + (text_type, float, bool, type(None))
+
+
+def is_constant(source):
+    """Return True if `source` is a literal expression whose JSON
+    serialization doesn't depend on the registered encoders.
+    """
+    try:
+        value = ast.literal_eval(source)
+    except Exception:
+        return False
+    def check(o):
+        if isinstance(o, SCALAR_TYPES):
+            return True
+        if isinstance(o, (list, tuple)):
+            return all(check(v) for v in o)
+        if isinstance(o, dict):
+            return all(check(k) and check(v) for k, v in o.items())
+        return False
+    return check(value)
+
+
 class Renderer(Renderer):
 
+    def compile(self, filepath, padded):
+        self._json = None
+        # Strip leading whitespace, like `eval` does when it's given a string
+        source = padded.lstrip(' \t')
+        try:
+            code = compile(source, filepath, 'eval')
+        except SyntaxError:
+            # Leave it to `eval` to raise the error when the page is rendered
+            self._constant = False
+            return padded
+        self._constant = is_constant(source)
+        return code
+
     def render_content(self, context):
         output = context['output']
         if not output.media_type:
             output.media_type = context['request_processor'].media_type_json
-        r = json_.dumps(eval(self.compiled, globals(), context))
+        if self._json is not None:
+            return self._json
+        r = (self.meta or json_.dumps)(eval(self.compiled, globals(), context))
         if isinstance(r, bytes):
             r = r.decode('ascii')
+        if self._constant:
+            self._json = r
         return r
 
 
 class Factory(Factory):
     Renderer = Renderer
 
+    def compile_meta(self, configuration):
+        if configuration.json_compact:
+            return json_.compact_encoder()
+        return None
@@ -0,0 +1,37 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from .json_dump import Factory, Renderer as JsonRenderer
+from .. import json_
+
+
+class Renderer(JsonRenderer):
+    """Render JSON as an iterable of bytestrings, see :func:`~aspen.simplates.json_.iterdumps`.
+    """
+
+    chunk_size = 65536
+
+    def compile(self, filepath, padded):
+        compiled = JsonRenderer.compile(self, filepath, padded)
+        # The output is never stored, and can't be checked for padding
+        self._constant = False
+        self._strip_padding = False
+        return compiled
+
+    def render_content(self, context):
+        output = context['output']
+        request_processor = context['request_processor']
+        if not output.media_type:
+            output.media_type = request_processor.media_type_json
+        output.charset = request_processor.encode_output_as
+        obj = eval(self.compiled, globals(), context)
+        return json_.iterdumps(obj, self.meta, output.charset, self.chunk_size)
+
+
+class Factory(Factory):
+    Renderer = Renderer
+
+    def compile_meta(self, configuration):
+        return json_.streaming_encoder(compact=configuration.json_compact)
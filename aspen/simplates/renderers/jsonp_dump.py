@@ -3,8 +3,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from . import Factory
-from .json_dump import Renderer as JsonRenderer
+from .json_dump import Factory, Renderer as JsonRenderer
 
 import re
 
@@ -3,14 +3,71 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import re
+from string import Formatter
+
 from . import Renderer, Factory
 
 
+FIELD_NAME_SPLIT = re.compile(r'[.\[]')
+
+
+def compile_fields(raw):
+    """Turn a format string with named fields into a positional one.
+
+    Return a `(format_string, names)` tuple, such that
+    ``format_string.format(*[context[name] for name in names])`` is the same
+    as ``raw.format(**context)``, or None if `raw` has positional or nested
+    fields, or can't be parsed.
+
+    >>> compile_fields('{foo} {bar.baz!r:>4} {foo[0]} {{}}') == ('{0} {1.baz!r:>4} {0[0]} {{}}', ('foo', 'bar'))
+    True
+
+    """
+    segments, names, indices = [], [], {}
+    try:
+        fields = list(Formatter().parse(raw))
+    except ValueError:
+        return None
+    for literal_text, field_name, format_spec, conversion in fields:
+        segments.append(literal_text.replace('{', '{{').replace('}', '}}'))
+        if field_name is None:
+            continue
+        if not field_name or field_name[0].isdigit() or '{' in format_spec:
+            # positional or nested fields, don't bother
+            return None
+        m = FIELD_NAME_SPLIT.search(field_name)
+        name, rest = (field_name[:m.start()], field_name[m.start():]) if m else (field_name, '')
+        if name not in indices:
+            indices[name] = len(names)
+            names.append(name)
+        segments.append('{%i%s%s%s}' % (
+            indices[name], rest,
+            '!' + conversion if conversion else '',
+            ':' + format_spec if format_spec else '',
+        ))
+    return ''.join(segments), tuple(names)
+
+
 class Renderer(Renderer):
 
+    def compile(self, filepath, padded):
+        compiled = compile_fields(self.raw)
+        self._strip_padding = compiled is None
+        return padded if compiled is None else compiled
+
     def render_content(self, context):
-        return self.compiled.format(**context)
+        if self._strip_padding:
+            return self.compiled.format(**context)
+        format_string, names = self.compiled
+        return format_string.format(*[context[name] for name in names])
+
+    def referenced_names(self):
+        if self._strip_padding:
+            return None
+        return set(self.compiled[1])
 
 
 class Factory(Factory):
     Renderer = Renderer
+    intern_renderers = True
@@ -3,15 +3,70 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import re
+
 from . import Renderer, Factory
 
 
+CONVERSION_RE = re.compile(
+    r'%(?:\((?P<key>[^()]*)\))?[#0 +-]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?(?P<type>[%a-zA-Z])'
+)
+
+
+def compile_conversions(raw):
+    """Turn a format string with mapping keys into one without.
+
+    Return a `(format_string, names)` tuple, such that
+    ``format_string % tuple(context[name] for name in names)`` is the same as
+    ``raw % context``, or None if `raw` has conversions without keys, `*`
+    widths or precisions, or can't be parsed.
+
+    >>> compile_conversions('%(foo)s %(bar)05.1f %%') == ('%s %05.1f %%', ('foo', 'bar'))
+    True
+
+    """
+    segments, names = [], []
+    start = 0
+    pos = raw.find('%')
+    while pos != -1:
+        m = CONVERSION_RE.match(raw, pos)
+        if m is None:
+            return None
+        key = m.group('key')
+        if key is None:
+            if m.group() != '%%':
+                # the whole context would be formatted
+                return None
+        else:
+            if '*' in m.group():
+                return None
+            segments.append(raw[start:pos + 1])
+            start = m.end('key') + 1
+            names.append(key)
+        pos = raw.find('%', m.end())
+    segments.append(raw[start:])
+    return ''.join(segments), tuple(names)
+
+
 class Renderer(Renderer):
 
+    def compile(self, filepath, padded):
+        compiled = compile_conversions(self.raw)
+        self._strip_padding = compiled is None
+        return padded if compiled is None else compiled
+
     def render_content(self, context):
-        return self.compiled % context
+        if self._strip_padding:
+            return self.compiled % context
+        format_string, names = self.compiled
+        return format_string % tuple([context[name] for name in names])
+
+    def referenced_names(self):
+        if self._strip_padding:
+            return None
+        return set(self.compiled[1])
 
 
 class Factory(Factory):
     Renderer = Renderer
-
+    intern_renderers = True
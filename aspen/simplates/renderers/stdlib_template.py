@@ -7,14 +7,54 @@ from . import Renderer, Factory
 from string import Template
 
 
+def compile_placeholders(raw):
+    """Turn a template string into a %-format string.
+
+    Return a `(format_string, names)` tuple, such that
+    ``format_string % tuple(context[name] for name in names)`` is the same as
+    ``Template(raw).substitute(context)``, or None if `raw` has invalid
+    placeholders.
+
+    >>> compile_placeholders('$foo ${bar}% $$') == ('%s %s%% $', ('foo', 'bar'))
+    True
+
+    """
+    segments, names = [], []
+    start = 0
+    for m in Template.pattern.finditer(raw):
+        if m.group('invalid') is not None:
+            return None
+        segments.append(raw[start:m.start()].replace('%', '%%'))
+        start = m.end()
+        name = m.group('named') or m.group('braced')
+        if name is not None:
+            segments.append('%s')
+            names.append(name)
+        elif m.group('escaped') is not None:
+            segments.append(Template.delimiter)
+    segments.append(raw[start:].replace('%', '%%'))
+    return ''.join(segments), tuple(names)
+
+
 class Renderer(Renderer):
 
     def compile(self, filepath, padded):
-        return Template(padded)
+        compiled = compile_placeholders(self.raw)
+        self._strip_padding = compiled is None
+        return Template(padded) if compiled is None else compiled
 
     def render_content(self, context):
-        return self.compiled.substitute(context)
+        if self._strip_padding:
+            return self.compiled.substitute(context)
+        format_string, names = self.compiled
+        return format_string % tuple([context[name] for name in names])
+
+    def referenced_names(self):
+        if self._strip_padding:
+            return None
+        return set(self.compiled[1])
 
 
 class Factory(Factory):
     Renderer = Renderer
+    intern_renderers = True
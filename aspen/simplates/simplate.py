@@ -3,13 +3,39 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from io import BytesIO
+import ast
+import inspect
+from io import BytesIO, StringIO
 import re
+import sys
+import tokenize
+import types
+
+from six import binary_type, integer_types, text_type
 
 from ..output import Output
 from .pagination import split_and_escape, parse_specline, Page
 from aspen.http.resource import Dynamic
 
+# Top-level `await` is supported since Python 3.8. Before that (and since 3.5)
+# a 'run every' page that awaits is compiled as the body of an `async def`.
+PyCF_ALLOW_TOP_LEVEL_AWAIT = getattr(ast, 'PyCF_ALLOW_TOP_LEVEL_AWAIT', 0)
+CO_COROUTINE = getattr(inspect, 'CO_COROUTINE', 0)
+
+# The types of the 'run once' values that prerendering can rely on.
+IMMUTABLE_TYPES = (text_type, binary_type, float, bool, type(None)) + integer_types
+
+
+def is_immutable(value):
+    """Return True if value is a str, bytes, number, bool, None, or a tuple of those.
+
+    Subclasses don't count, since they can override ``__str__`` and friends.
+    """
+    if type(value) is tuple:
+        return all(is_immutable(v) for v in value)
+    return type(value) in IMMUTABLE_TYPES
+
+
 renderer_re = re.compile(r'[a-z0-9.-_]+$')
 media_type_re = re.compile(r'[A-Za-z0-9.+*-]+/[A-Za-z0-9.+*-]+$')
 
@@ -62,6 +88,55 @@ def _decode(raw):
     return fulltext.decode(encoding)
 
 
+def _compile_coroutine_function(source, filename):
+    """Compile source as the body of an ``async def``, return the code object
+    of the function, or None if that isn't valid Python either.
+
+    The function is meant to be called with the context as its globals, it
+    returns its ``locals()``, that is the names assigned by the page. Since
+    those are local variables, a page can't reassign a name it reads from the
+    context (``foo = foo + 1`` raises UnboundLocalError).
+    """
+    try:
+        # The lines that start inside a multi-line string mustn't be indented
+        in_string = set()
+        for token in tokenize.generate_tokens(StringIO(source).readline):
+            if token[0] == tokenize.STRING:
+                in_string.update(range(token[2][0] + 1, token[3][0] + 1))
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    lines = source.splitlines(True)
+    if lines and lines[-1][-1:] != '\n':
+        lines[-1] += '\n'
+    lines = [line if i in in_string else '    ' + line for i, line in enumerate(lines, 1)]
+    header = 'async def __run_every__():\n'
+    if lines and not lines[0].strip():
+        lines[0] = header  # take the place of a padding line, to keep line numbers
+    else:
+        lines.insert(0, header)
+    lines.append('    return locals()\n')
+    wrapped = ''.join(lines)
+    try:
+        function = ast.parse(wrapped).body[0]
+        if _returns_or_yields(function.body[:-1]):
+            return None
+        code = compile(wrapped, filename, 'exec')
+    except SyntaxError:
+        return None
+    return next(c for c in code.co_consts if isinstance(c, types.CodeType))
+
+
+def _returns_or_yields(nodes):
+    for node in nodes:
+        if isinstance(node, (ast.Return, ast.Yield, ast.YieldFrom)):
+            return True
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            continue
+        if _returns_or_yields(ast.iter_child_nodes(node)):
+            return True
+    return False
+
+
 class SimplateDefaults(object):
     def __init__(self, renderers_by_media_type, renderer_factories, initial_context):
         """
@@ -98,8 +173,11 @@ class Simplate(Dynamic):
 
         self.renderers = {}         # mapping of media type to Renderer objects
         self.available_types = []   # ordered sequence of media types
+        self.prerendered = {}       # mapping of media type to Output attributes
         pages = self.parse_into_pages(self.decoded)
+        run_every = pages[1]
         self.pages = self.compile_pages(pages)
+        self.prerender(run_every)
 
 
     def render_for_type(self, media_type, context):
@@ -112,14 +190,49 @@ class Simplate(Dynamic):
                       over from the execution of the zeroth page
         """
 
+        prerendered = self.prerendered.get(media_type)
+        if prerendered is not None:
+            # the output doesn't depend on the request, serve a fresh copy
+            output = context['output'] = Output(**prerendered)
+            return output
+
+        context = self.make_context(media_type, context)
+        if self.run_every_is_coroutine:
+            raise RuntimeError( "%s awaits in its 'run every' page, it can only be "
+                                "rendered by RequestProcessor.process_async()" % self.fs
+                               )
+        # use this as the context to execute the second page in
+        exec(self.pages[1], context)
+        return self.render_page(media_type, context)
+
+
+    def run_every_async(self, context):
+        """Return a coroutine that runs the 'run every' page in context.
+
+        The result of the coroutine is None, or a dict of the names assigned
+        by the page, which the caller must add to the context.
+        """
+        if self._run_every_is_function:
+            return types.FunctionType(self.pages[1], context)()
+        return eval(self.pages[1], context)
+
+
+    def make_context(self, media_type, context):
+        """Given a media type and the state dict, return the execution context.
+        """
         # create Output object and put it in the state
-        output = context['output'] = Output(media_type=media_type)
+        context['output'] = Output(media_type=media_type)
         # copy the state dict to avoid accidentally mutating it
         context = dict(context)
         # override it with values from the first page
         context.update(self.pages[0])
-        # use this as the context to execute the second page in
-        exec(self.pages[1], context)
+        return context
+
+
+    def render_page(self, media_type, context):
+        """Given a media type and the context in which the second page has been
+        executed, render the content page and return the Output.
+        """
         # refetch output, this allows the second page to override it
         output = context['state']['output']
         # skip rendering if the second page has already filled output.body
@@ -138,6 +251,58 @@ class Simplate(Dynamic):
         return output
 
 
+    def prerender(self, run_every):
+        """Given the uncompiled 'run every' page, render constant content pages.
+
+        A content page is constant if its output doesn't depend on the request.
+        That's the case when the 'run every' page is empty and the renderer
+        reports that the template only reads names that the 'run once' page
+        bound to immutable values (see :func:`is_immutable`), since any other
+        object could render differently from one request to the next. The
+        'run once' page can also declare the whole simplate constant (or not)
+        explicitly by setting `__constant__` to True (or False).
+
+        Constant pages are rendered and encoded once, here, and the resulting
+        Output attributes are stored in self.prerendered. Nothing is
+        prerendered when changes_reload is on.
+
+        """
+        if self.request_processor.changes_reload or self.run_every_is_coroutine:
+            return
+        run_once = self.pages[0]
+        declared = run_once.get('__constant__')
+        if declared is None:
+            if ast.parse(run_every.content).body:
+                return
+            available = set(k for k, v in run_once.items() if is_immutable(v))
+            if '__all__' in run_once:
+                available.intersection_update(run_once['__all__'])
+        elif not declared:
+            return
+
+        for renderer, media_type in self.pages[2:]:
+            if not declared:
+                names = renderer.referenced_names()
+                if names is None or not available.issuperset(names):
+                    continue
+            state = {}
+            state['state'] = state
+            try:
+                output = self.render_for_type(media_type, state)
+                if isinstance(output.body, text_type):
+                    output.charset = self.request_processor.encode_output_as
+                    output.body = output.body.encode(output.charset)
+            except Exception:
+                if declared:
+                    raise
+                # leave it to request time
+                continue
+            if not isinstance(output.body, bytes):
+                # a streamed body can only be consumed once
+                continue
+            self.prerendered[media_type] = dict(output.__dict__)
+
+
     def parse_into_pages(self, decoded):
         """Given a bytestring that is the entire simplate, return a list of pages.
 
@@ -185,7 +350,20 @@ class Simplate(Dynamic):
         exec(one, context)    # mutate context
         one = context          # store it
 
-        two = compile(two.padded_content, self.fs, 'exec')
+        # The second page is allowed to `await`, which turns it into a
+        # coroutine that only RequestProcessor.process_async() can run.
+        self._run_every_is_function = False
+        try:
+            source = two.padded_content
+            two = compile(source, self.fs, 'exec', PyCF_ALLOW_TOP_LEVEL_AWAIT)
+        except SyntaxError:
+            if PyCF_ALLOW_TOP_LEVEL_AWAIT or sys.version_info < (3, 5):
+                raise
+            two = _compile_coroutine_function(source, self.fs)
+            if two is None:
+                raise
+            self._run_every_is_function = True
+        self.run_every_is_coroutine = bool(two.co_flags & CO_COROUTINE)
 
         pages[:2] = (one, two)
         pages[2:] = [self.compile_page(page) for page in pages[2:]]
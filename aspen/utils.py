@@ -1,3 +1,6 @@
+from collections import OrderedDict
+from threading import Lock
+
 
 class Constant(object):
     """A simple class that creates lightweight constants.
@@ -30,3 +33,66 @@ class Constant(object):
 
     def __setattr__(self, name, value):
         raise AttributeError("constants cannot be modified")
+
+
+class LRUCache(object):
+    """A bounded mapping that discards the least recently used items.
+
+    >>> cache = LRUCache(2)
+    >>> cache['a'] = 1
+    >>> cache['b'] = 2
+    >>> cache.get('a')
+    1
+    >>> cache['c'] = 3
+    >>> cache.get('b') is None
+    True
+    >>> len(cache)
+    2
+
+    It's thread-safe.
+
+    """
+
+    __slots__ = ('maxsize', '_data', '_lock')
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            data = self._data
+            data.pop(key, None)
+            data[key] = value
+            if len(data) > self.maxsize:
+                data.popitem(last=False)
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if key isn't in the cache.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def pop(self, key, default=None):
+        """Remove key from the cache and return its value, or default.
+        """
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """Remove all items from the cache.
+        """
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,51 @@
+"""Compare `Algorithm.run` with the compiled algorithm of `aspen.request_processor.compiler`.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from timeit import timeit
+
+from filesystem_tree import FilesystemTree
+
+from aspen.request_processor import RequestProcessor
+
+
+FILES = [
+    ('static.txt', 'Greetings, program!'),
+    ('simplate.spt', "[---]\n[---] text/plain\nGreetings, program!"),
+    ('%user/index.spt', "[---]\n[---] text/plain\n%(path)s"),
+]
+
+REQUESTS = [
+    ('static, in RAM', '/static.txt'),
+    ('simplate', '/simplate'),
+    ('wildcard', '/alice/'),
+    ('not found', '/nope.txt'),
+]
+
+N = 20000
+
+
+def main():
+    with FilesystemTree() as www:
+        www.mk(*FILES)
+        rp = RequestProcessor(www_root=www.root, store_static_files_in_ram=True)
+        total_run = total_compiled = 0
+        for label, path in REQUESTS:
+            def process():
+                rp.process(path, 'page=2', None)
+            rp.compile_algorithm = False
+            process()
+            t_run = timeit(process, number=N) / N
+            rp.compile_algorithm = True
+            process()
+            t_compiled = timeit(process, number=N) / N
+            total_run += t_run
+            total_compiled += t_compiled
+            print("%-16s Algorithm.run %6.2f us, compiled %6.2f us (%.2fx)" % (
+                label, t_run * 1e6, t_compiled * 1e6, t_run / t_compiled
+            ))
+        print("Total: %.2fx" % (total_run / total_compiled))
+
+
+if __name__ == '__main__':
+    main()
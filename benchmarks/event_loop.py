@@ -0,0 +1,89 @@
+"""Compare event loop latency under concurrent requests.
+
+The sync path runs `RequestProcessor.process` in a thread pool, the async path
+awaits `RequestProcessor.process_async`. While the requests are being
+processed, a monitor task measures how late the event loop wakes it up.
+
+Requires Python 3.5+.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from filesystem_tree import FilesystemTree
+
+from aspen.request_processor import RequestProcessor
+from aspen.testing import teardown
+
+
+N_REQUESTS = 2000
+CONCURRENCY = 100
+TICK = 0.001
+
+FILES = [
+    ('static.txt', 'x' * 100000),
+    ('sync.spt', "import time\n[---]\ntime.sleep(0.002)\n[---] text/plain\nblocking client"),
+    ('async.spt', "import asyncio\n[---]\nawait asyncio.sleep(0.002)\n[---] text/plain\nasync client"),
+]
+
+
+async def monitor(lags, stop):
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - start - TICK)
+
+
+async def bench(process, path):
+    lags, stop = [], asyncio.Event()
+    monitor_task = asyncio.ensure_future(monitor(lags, stop))
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            await process(path)
+
+    start = perf_counter()
+    await asyncio.gather(*[one() for i in range(N_REQUESTS)])
+    elapsed = perf_counter() - start
+    stop.set()
+    await monitor_task
+    lags.sort()
+    return elapsed, lags[len(lags) // 2], lags[int(len(lags) * 0.99)], lags[-1]
+
+
+def main():
+    with FilesystemTree() as www:
+        www.mk(*FILES)
+        for store_in_ram in (False, True):
+            teardown()
+            rp = RequestProcessor(www_root=www.root, store_static_files_in_ram=store_in_ram)
+            pool = ThreadPoolExecutor(CONCURRENCY)
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+
+            def process_in_thread(path):
+                return loop.run_in_executor(pool, rp.process, path, '', None)
+
+            def process_async(path):
+                return rp.process_async(path, '', None)
+
+            print("store_static_files_in_ram =", store_in_ram)
+            for label, process, path in [ ('static, sync in threads', process_in_thread, '/static.txt')
+                                        , ('static, async', process_async, '/static.txt')
+                                        , ('simplate, sync in threads', process_in_thread, '/sync')
+                                        , ('simplate, async', process_async, '/async')
+                                         ]:
+                elapsed, p50, p99, worst = loop.run_until_complete(bench(process, path))
+                print("  %-26s %6.0f req/s | loop lag p50 %6.3f ms, p99 %6.3f ms, max %6.3f ms" %
+                      (label, N_REQUESTS / elapsed, p50 * 1000, p99 * 1000, worst * 1000))
+            loop.close()
+            pool.shutdown()
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Compare the default (pretty) and compact JSON output of json_dump.
+
+The payload is a large nested structure, like a paginated API response.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from timeit import timeit
+
+from filesystem_tree import FilesystemTree
+
+from aspen.request_processor import RequestProcessor
+from aspen.testing import teardown
+
+
+SIMPLATE = """\
+import datetime
+[---]
+items = [
+    { 'id': i
+    , 'name': 'Item number %i' % i
+    , 'price': i * 1.25
+    , 'tags': ['tag%i' % j for j in range(i % 7)]
+    , 'created': datetime.date(2020, 1, 1 + i % 28)
+    , 'owner': {'id': i % 100, 'username': 'user%i' % (i % 100), 'active': i % 3 == 0}
+     }
+    for i in range(2000)
+]
+[---] application/json
+{'count': len(items), 'next': None, 'results': items}
+"""
+
+N = 20
+
+
+def main():
+    with FilesystemTree() as www:
+        www.mk(('items.json.spt', SIMPLATE))
+        for json_compact in (False, True):
+            teardown()
+            rp = RequestProcessor(www_root=www.root, json_compact=json_compact)
+            process = lambda: rp.process('/items.json', '', None)
+            body = process()['output'].body
+            elapsed = timeit(process, number=N)
+            print("json_compact = %-5s %8i bytes, %6.1f ms per request, %6.1f MB/s" % (
+                json_compact, len(body), elapsed / N * 1000, len(body) * N / elapsed / 1e6
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Measure encoder lookup in FriendlyEncoder over a mixed-type payload.
+
+Compares the memoized MRO-aware lookup (`json_.get_encoder`) with an
+unmemoized walk of the MRO, and with the old exact-class lookup, which only
+works when no subclasses are involved.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import deque
+import datetime
+from decimal import Decimal
+from inspect import getmro
+from timeit import timeit
+
+from aspen.simplates import json_
+
+
+class Money(Decimal):
+    pass
+
+class Timestamp(datetime.datetime):
+    pass
+
+json_.register_encoder(Decimal, str)
+
+
+def payload(subclasses):
+    D, T = (Money, Timestamp) if subclasses else (Decimal, datetime.datetime)
+    return [
+        { 'id': i
+        , 'price': D('%i.99' % i)
+        , 'created': T(2020, 1, 1 + i % 28, 12, 30)
+        , 'date': datetime.date(2020, 1, 1 + i % 28)
+        , 'point': complex(i, -i)
+        , 'tags': {'a', 'b'} if subclasses else ['a', 'b']
+        , 'history': deque([i, i + 1]) if subclasses else [i, i + 1]
+         }
+        for i in range(1000)
+    ]
+
+
+class ExactEncoder(json_.FriendlyEncoder):
+    def default(self, obj):
+        encode = json_.encoders.get(obj.__class__)
+        if encode is None:
+            return json_._json.JSONEncoder.default(self, obj)
+        return encode(obj)
+
+
+class UnmemoizedEncoder(json_.FriendlyEncoder):
+    def default(self, obj):
+        for base in getmro(obj.__class__):
+            if base in json_.encoders:
+                return json_.encoders[base](obj)
+        return json_._json.JSONEncoder.default(self, obj)
+
+
+N = 50
+
+
+def main():
+    exact = payload(subclasses=False)
+    mixed = payload(subclasses=True)
+    for label, cls, data in [ ('exact class (exact-only payload)', ExactEncoder, exact)
+                            , ('memoized MRO (exact-only payload)', json_.FriendlyEncoder, exact)
+                            , ('unmemoized MRO (mixed payload)', UnmemoizedEncoder, mixed)
+                            , ('memoized MRO (mixed payload)', json_.FriendlyEncoder, mixed)
+                             ]:
+        for compact in (False, True):
+            kw = {'separators': (',', ':')} if compact else {'sort_keys': True, 'indent': 4}
+            encode = cls(**kw).encode
+            elapsed = timeit(lambda: encode(data), number=N)
+            print("%-34s %-7s %6.2f ms" % (label, 'compact' if compact else 'pretty',
+                                           elapsed / N * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Measure the parsing and access patterns of `aspen.http.mapping.Mapping`.
+
+The previous implementation, which went through the `dict` class on every call
+and allocated a list in `get` and `add`, is included for comparison.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from timeit import timeit
+
+from aspen.http.mapping import Mapping
+from aspen.http.request import Path, Querystring
+
+
+class LegacyMapping(dict):
+
+    def __getitem__(self, name):
+        try:
+            return dict.__getitem__(self, name)[-1]
+        except KeyError:
+            raise
+
+    def __setitem__(self, name, value):
+        dict.__setitem__(self, name, [value])
+
+    def all(self, name):
+        return dict.get(self, name, [])
+
+    def get(self, name, default=None):
+        return dict.get(self, name, [default])[-1]
+
+    def add(self, name, value):
+        if name in self:
+            self.all(name).append(value)
+        else:
+            dict.__setitem__(self, name, [value])
+
+
+QUERYSTRING = 'q=hello+world&page=2&sort=-date&tag=a&tag=b'
+
+
+def parse(cls):
+    m = cls()
+    for k, v in (('q', 'hello world'), ('page', '2'), ('sort', '-date')):
+        m[k] = v
+    m.add('tag', 'a')
+    m.add('tag', 'b')
+    return m
+
+
+PATTERNS = [
+    ('parse', lambda m, cls: parse(cls)),
+    ('getitem', lambda m, cls: m['page']),
+    ('get', lambda m, cls: m.get('page')),
+    ('get missing', lambda m, cls: m.get('missing', '1')),
+    ('all', lambda m, cls: m.all('tag')),
+    ('add', lambda m, cls: m.add('page', '3')),
+    ('setitem', lambda m, cls: m.__setitem__('page', '3')),
+]
+
+N = 500000
+
+
+def main():
+    total_legacy = total_new = 0
+    for label, pattern in PATTERNS:
+        legacy, new = parse(LegacyMapping), parse(Mapping)
+        assert dict(new) == dict(legacy)
+        t_legacy = timeit(lambda: pattern(legacy, LegacyMapping), number=N) / N
+        t_new = timeit(lambda: pattern(new, Mapping), number=N) / N
+        total_legacy += t_legacy
+        total_new += t_new
+        print("%-12s legacy %6.3f us, new %6.3f us (%.2fx)" % (
+            label, t_legacy * 1e6, t_new * 1e6, t_legacy / t_new
+        ))
+    print("Total: %.2fx" % (total_legacy / total_new))
+    n = N // 10
+    print("Querystring(%r): %.2f us" % (
+        QUERYSTRING, timeit(lambda: Querystring(QUERYSTRING), number=n) / n * 1e6
+    ))
+    print("Path('/api/v1/users/1234'): %.2f us" % (
+        timeit(lambda: Path('/api/v1/users/1234'), number=n) / n * 1e6
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Measure content negotiation with and without the per-resource memo.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from timeit import timeit
+
+from filesystem_tree import FilesystemTree
+
+from aspen.request_processor import RequestProcessor
+from aspen.request_processor.dispatcher import DispatchResult, DispatchStatus
+from aspen import resources
+
+
+SIMPLATE = """\
+[---]
+[---] text/html
+<p>Greetings, program!</p>
+[---] application/json via json_dump
+{'greeting': 'Greetings, program!'}
+[---] text/plain
+Greetings, program!
+"""
+
+ACCEPT_HEADERS = [
+    # Firefox
+    'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+    # Chrome
+    'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,'
+    'image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    # Safari
+    'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    # API clients
+    'application/json',
+    'application/json, text/plain, */*',
+    '*/*',
+]
+
+N = 20000
+
+
+def main():
+    with FilesystemTree() as www:
+        www.mk(('index.spt', SIMPLATE))
+        rp = RequestProcessor(www_root=www.root)
+        resource = resources.get(rp, www.resolve('index.spt'))
+        dispatch_result = DispatchResult(DispatchStatus.okay, None, {}, None, None)
+        total_uncached = total_memoized = 0
+        for accept in ACCEPT_HEADERS:
+            state = {'dispatch_result': dispatch_result, 'accept_header': accept}
+            uncached = timeit(lambda: resource._negotiate(accept, None), number=N)
+            memoized = timeit(lambda: resource.negotiate(state), number=N)
+            total_uncached += uncached
+            total_memoized += memoized
+            print("%-20s %-18s uncached %5.2f us, memoized %5.2f us (%.0fx)" % (
+                accept[:20], resource.negotiate(state),
+                uncached / N * 1e6, memoized / N * 1e6, uncached / memoized
+            ))
+        print("Total: uncached %.3f s, memoized %.3f s (%.0fx)" % (
+            total_uncached, total_memoized, total_uncached / total_memoized
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Measure the parsing of request paths by `aspen.http.request.Path`.
+
+The previous implementation, which built a params Mapping for every segment,
+decoded the path twice and unquoted every string, is included for comparison.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from timeit import timeit
+
+from aspen.http.mapping import Mapping
+from aspen.http.request import Path, PathPart, _unquote_path as legacy_path_decode
+
+
+def legacy_extract_rfc2396_params(path):
+    pathsegs = path.lstrip('/').split('/')
+    segments_with_params = []
+    for component in pathsegs:
+        parts = component.split(';')
+        params = Mapping()
+        segment = legacy_path_decode(parts[0])
+        for p in parts[1:]:
+            if '=' in p:
+                k, v = p.split('=', 1)
+            else:
+                k, v = p, ''
+            params.add(legacy_path_decode(k), legacy_path_decode(v))
+        segments_with_params.append(PathPart(segment, params))
+    return segments_with_params
+
+
+class LegacyPath(Mapping):
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.decoded = legacy_path_decode(raw)
+        self.parts = legacy_extract_rfc2396_params(raw)
+
+
+PATHS = [
+    # typical
+    ('root', '/'),
+    ('page', '/about/team.html'),
+    ('api', '/api/v1/users/1234/posts/5678.json'),
+    ('unicode', '/wiki/%E2%98%83/%C3%A9t%C3%A9'),
+    # with params
+    ('params', '/frisbee;color=red;size=small/logo;sponsor=w3c;color=black/image.jpg'),
+    # adversarial
+    ('many segments', '/a' * 200),
+    ('many params', '/foo' + ';a=1' * 200),
+    ('many escapes', '/' + '%41' * 500),
+]
+
+N = 20000
+
+
+def main():
+    total_legacy = total_new = 0
+    for label, raw in PATHS:
+        legacy, new = LegacyPath(raw), Path(raw)
+        assert new.decoded == legacy.decoded
+        assert new.parts == legacy.parts
+        assert [p.params for p in new.parts] == [p.params for p in legacy.parts]
+        n = N if len(raw) < 100 else N // 20
+        t_legacy = timeit(lambda: LegacyPath(raw), number=n) / n
+        t_new = timeit(lambda: Path(raw), number=n) / n
+        total_legacy += t_legacy
+        total_new += t_new
+        print("%-14s legacy %8.2f us, new %8.2f us (%.1fx)" % (
+            label, t_legacy * 1e6, t_new * 1e6, t_legacy / t_new
+        ))
+    print("Total: %.1fx" % (total_legacy / total_new))
+
+
+if __name__ == '__main__':
+    main()
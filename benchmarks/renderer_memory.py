@@ -0,0 +1,75 @@
+"""Measure the memory used by the renderers of a large site, with and without
+interning identical content pages.
+
+Requires Python 3 (for tracemalloc).
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import gc
+import tracemalloc
+
+from filesystem_tree import FilesystemTree
+
+from aspen import resources
+from aspen.request_processor import RequestProcessor
+from aspen.simplates.renderers import stdlib_format, stdlib_percent, stdlib_template
+from aspen.testing import teardown
+
+
+LAYOUT = "<html><head><title>{title}</title></head><body>%s</body></html>" % (
+    "<div class='boilerplate'>{body}</div>" * 50
+)
+
+SIMPLATE = """\
+[---]
+title = 'Page %i'
+body = 'Lorem ipsum'
+[---] text/html via stdlib_format
+""" + LAYOUT + """
+[---] text/plain
+%%(title)s: %%(body)s
+[---] text/x-template via stdlib_template
+$title
+"""
+
+N = 2000
+
+FACTORIES = [stdlib_format.Factory, stdlib_percent.Factory, stdlib_template.Factory]
+
+
+def measure(www, intern_renderers):
+    for factory in FACTORIES:
+        factory.intern_renderers = intern_renderers
+    teardown()
+    rp = RequestProcessor(www_root=www.root)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    simplates = [resources.get(rp, www.resolve('page%i.spt' % i)) for i in range(N)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    renderers = set(id(r) for s in simplates for r in s.renderers.values())
+    return used, len(renderers)
+
+
+def main():
+    with FilesystemTree() as www:
+        www.mk(*[('page%i.spt' % i, SIMPLATE % i) for i in range(N)])
+        results = {}
+        for intern_renderers in (False, True):
+            used, n_renderers = measure(www, intern_renderers)
+            results[intern_renderers] = used
+            print("intern_renderers = %-5s %6i renderers, %7.2f MB for %i simplates" % (
+                intern_renderers, n_renderers, used / 1e6, N
+            ))
+        for factory in FACTORIES:
+            factory.intern_renderers = True
+        print("Savings: %.2f MB (%.0f%%)" % (
+            (results[False] - results[True]) / 1e6,
+            (results[False] - results[True]) / results[False] * 100,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Measure requests for static files with and without the static fast lane.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from timeit import timeit
+
+from filesystem_tree import FilesystemTree
+
+from aspen.request_processor import RequestProcessor
+from aspen.testing import teardown
+
+
+N = 20000
+
+
+def main():
+    with FilesystemTree() as www:
+        www.mk(('index.html', 'Greetings, program!'), ('css/style.css', 'body {}'))
+        for store_in_ram in (False, True):
+            for path in ('/', '/css/style.css'):
+                timings = []
+                for cache_size in (0, 1024):
+                    teardown()
+                    rp = RequestProcessor(www_root=www.root, store_static_files_in_ram=store_in_ram)
+                    rp.static_routes_cache_size = cache_size
+                    process = lambda: rp.process(path, '', None)
+                    process()
+                    timings.append(timeit(process, number=N) / N)
+                print("store_in_ram=%-5s %-15s full %6.2f us, fast lane %6.2f us (%.1fx)" % (
+                    store_in_ram, path, timings[0] * 1e6, timings[1] * 1e6, timings[0] / timings[1]
+                ))
+
+
+if __name__ == '__main__':
+    main()
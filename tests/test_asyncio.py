@@ -0,0 +1,145 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+
+import pytest
+from pytest import raises
+
+asyncio = pytest.importorskip('asyncio')
+if sys.version_info < (3, 5):
+    pytest.skip("process_async requires Python 3.5+", allow_module_level=True)
+
+from aspen.simplates import simplate
+
+
+def process(harness, path='/', querystring='', accept_header=None, **kw):
+    coroutine = harness.request_processor.process_async(
+        path, querystring, accept_header, raise_immediately=True, **kw
+    )
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_process_async_serves_static_files(harness):
+    harness.fs.www.mk(('index.html', "Greetings, program!"))
+    output = process(harness)['output']
+    assert output.body == b"Greetings, program!"
+    assert output.media_type == 'text/html'
+
+def test_process_async_serves_static_files_from_ram(harness):
+    harness.hydrate_request_processor(store_static_files_in_ram=True)
+    harness.fs.www.mk(('index.html', "Greetings, program!"))
+    harness.request_processor.dispatcher.build_dispatch_tree()
+    assert process(harness)['output'].body == b"Greetings, program!"
+
+def test_process_async_renders_simplates(harness):
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = path.raw\n[---] text/plain\n%(foo)s"))
+    assert process(harness)['output'].text == "/"
+
+def test_process_async_awaits_in_the_second_page(harness):
+    harness.fs.www.mk(('index.spt', """
+import asyncio
+[---]
+foo = await asyncio.sleep(0, result='bar')
+[---] text/plain
+%(foo)s"""))
+    assert process(harness)['output'].text == "bar"
+
+def test_process_refuses_to_render_awaiting_simplates(harness):
+    harness.fs.www.mk(('index.spt', """
+import asyncio
+[---]
+await asyncio.sleep(0)
+[---] text/plain
+Greetings, program!"""))
+    with raises(RuntimeError):
+        harness.simple(filepath=None)
+
+@pytest.fixture
+def without_top_level_await(monkeypatch):
+    # Compile the 'run every' page as the body of an `async def`, like before Python 3.8
+    monkeypatch.setattr(simplate, 'PyCF_ALLOW_TOP_LEVEL_AWAIT', 0)
+
+def test_process_async_awaits_in_an_async_function(harness, without_top_level_await):
+    harness.fs.www.mk(('index.spt', """
+import asyncio
+prefix = 'b'
+[---]
+doc = \"""
+a
+\"""
+if prefix:
+    foo = await asyncio.sleep(0, result=prefix + 'ar')
+[---] text/plain
+%(foo)s %(doc)s"""))
+    assert process(harness)['output'].text == "bar \na\n"
+
+def test_async_functions_keep_the_line_numbers_of_the_page(harness, without_top_level_await):
+    harness.fs.www.mk(('index.spt', "import asyncio\n[---]\nawait asyncio.sleep(0)\nfoo = bar\n[---]\n%(foo)s"))
+    with raises(NameError) as info:
+        process(harness)
+    assert info.traceback[-1].lineno + 1 == 4
+
+@pytest.mark.parametrize('page', ["await foo(\n", "await foo()\nreturn 1", "await foo()\nyield 1"])
+def test_async_functions_dont_hide_syntax_errors(harness, without_top_level_await, page):
+    harness.fs.www.mk(('index.spt', "[---]\n%s\n[---]\nGreetings, program!" % page))
+    with raises(SyntaxError):
+        process(harness)
+
+def test_process_async_honors_return_after(harness):
+    harness.fs.www.mk(('index.html', "Greetings, program!"))
+    state = process(harness, return_after='dispatch_path_to_filesystem')
+    assert 'dispatch_result' in state
+    assert 'resource' not in state
+
+def test_process_async_raises_immediately(harness):
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = bar\n[---]\n%(foo)s"))
+    with raises(NameError):
+        process(harness)
+
+def test_process_async_runs_exception_handlers(harness):
+    def handle(exception):
+        return {'exception': None, 'handled': exception}
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = bar\n[---]\n%(foo)s"))
+    harness.request_processor.algorithm.insert_after('encode_output', handle)
+    coroutine = harness.request_processor.process_async('/', '', None)
+    loop = asyncio.new_event_loop()
+    try:
+        state = loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+    assert isinstance(state['handled'], NameError)
+
+def test_process_async_calls_exception_handlers_inside_the_except_block(harness):
+    def handle(exception):
+        assert sys.exc_info()[1] is exception
+        raise KeyError('handler')
+    def handle_again(exception):
+        assert isinstance(sys.exc_info()[1], KeyError)
+        return {'exception': None, 'handled': exception}
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = bar\n[---]\n%(foo)s"))
+    harness.request_processor.algorithm.insert_after('render_resource', handle, handle_again)
+    coroutine = harness.request_processor.process_async('/', '', None)
+    loop = asyncio.new_event_loop()
+    try:
+        state = loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+    assert isinstance(state['handled'], KeyError)
+    assert state['output'] is not None
+
+def test_process_async_reraises_unhandled_exceptions(harness):
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = bar\n[---]\n%(foo)s"))
+    coroutine = harness.request_processor.process_async('/', '', None, raise_immediately=False)
+    loop = asyncio.new_event_loop()
+    try:
+        with raises(NameError):
+            loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
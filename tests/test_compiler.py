@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+
+from algorithm import Algorithm, FunctionNotFound
+from pytest import raises
+
+from aspen.request_processor.compiler import CompiledAlgorithm
+
+
+def process(harness, path='/', querystring='', **kw):
+    harness.request_processor.compile_algorithm = True
+    return harness.request_processor.process(path, querystring, None, **kw)
+
+
+def test_compiled_algorithm_serves_static_files(harness):
+    harness.fs.www.mk(('index.html', "Greetings, program!"))
+    output = process(harness, raise_immediately=True)['output']
+    assert output.body == b"Greetings, program!"
+    assert output.media_type == 'text/html'
+
+def test_compiled_algorithm_renders_simplates(harness):
+    harness.fs.www.mk(('%name.spt', "[---]\nfoo = path['name']\n[---] text/plain\n%(foo)s"))
+    assert process(harness, '/alice', raise_immediately=True)['output'].text == "alice"
+
+def test_compiled_algorithm_honors_return_after(harness):
+    harness.fs.www.mk(('index.html', "Greetings, program!"))
+    state = process(harness, return_after='dispatch_path_to_filesystem')
+    assert 'dispatch_result' in state
+    assert 'resource' not in state
+
+def test_compiled_algorithm_raises_FunctionNotFound(harness):
+    with raises(FunctionNotFound):
+        process(harness, return_after='nope')
+
+def test_compiled_algorithm_raises_immediately(harness):
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = bar\n[---]\n%(foo)s"))
+    with raises(NameError):
+        process(harness, raise_immediately=True)
+
+def test_compiled_algorithm_runs_exception_handlers(harness):
+    def handle(exception):
+        return {'exception': None, 'handled': exception}
+    def after(handled):
+        return {'after': handled}
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = bar\n[---]\n%(foo)s"))
+    harness.request_processor.algorithm.insert_after('render_resource', handle, after)
+    state = process(harness, raise_immediately=False)
+    assert isinstance(state['handled'], NameError)
+    assert state['after'] is state['handled']
+    assert state['exception'] is None
+
+def test_compiled_algorithm_calls_exception_handlers_inside_the_except_block(harness):
+    def handle(exception):
+        assert sys.exc_info()[1] is exception
+        raise KeyError('handler')
+    def handle_again(exception):
+        assert isinstance(sys.exc_info()[1], KeyError)
+        return {'exception': None, 'handled': exception}
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = bar\n[---]\n%(foo)s"))
+    harness.request_processor.algorithm.insert_after('render_resource', handle, handle_again)
+    state = process(harness, raise_immediately=False)
+    assert isinstance(state['handled'], KeyError)
+
+def test_compiled_algorithm_reraises_unhandled_exceptions(harness):
+    harness.fs.www.mk(('index.spt', "[---]\nfoo = bar\n[---]\n%(foo)s"))
+    with raises(NameError):
+        process(harness, raise_immediately=False)
+
+def test_compiled_algorithm_is_regenerated_when_functions_change(harness):
+    harness.fs.www.mk(('index.html', "Greetings, program!"))
+    assert 'foo' not in process(harness)
+    harness.request_processor.algorithm.insert_after('encode_output', lambda: {'foo': 1})
+    assert process(harness)['foo'] == 1
+
+
+# CompiledAlgorithm
+# =================
+
+def test_compiled_algorithm_passes_state_and_defaults():
+    def foo(bar, baz=2):
+        return {'foo': bar + baz}
+    def buz(foo, baz=3):
+        return {'buz': foo * baz}
+    state = CompiledAlgorithm(Algorithm(foo, buz)).run(bar=1, baz=4)
+    assert state['foo'] == 5
+    assert state['buz'] == 20
+
+def test_compiled_algorithm_skips_exception_handlers_in_the_normal_flow():
+    def foo():
+        return {'foo': 1}
+    def handle(exception):
+        return {'handled': True}
+    def bar(exception=None):
+        return {'bar': exception}
+    state = CompiledAlgorithm(Algorithm(foo, handle, bar)).run()
+    assert state['foo'] == 1
+    assert 'handled' not in state
+    assert state['bar'] is None
+
+def test_compiled_algorithm_raises_TypeError_for_missing_state():
+    def foo(bar):
+        pass
+    with raises(TypeError):
+        CompiledAlgorithm(Algorithm(foo)).run(_raise_immediately=True)
+
+def test_compiled_algorithm_handles_missing_state_like_Algorithm_run():
+    def foo(bar):
+        pass
+    def handle(exception):
+        return {'exception': None, 'handled': exception}
+    for algorithm in (Algorithm(foo, handle), CompiledAlgorithm(Algorithm(foo, handle))):
+        assert isinstance(algorithm.run()['handled'], TypeError)
+
+def test_compiled_algorithm_calls_other_callables_with_dependency_injection():
+    class Foo(object):
+        def __call__(self, bar):
+            return {'foo': bar}
+    assert CompiledAlgorithm(Algorithm(Foo())).run(bar=1)['foo'] == 1
@@ -8,6 +8,7 @@ import os
 import pytest
 
 import aspen
+from aspen.request_processor import typecasting
 from aspen.request_processor.dispatcher import Dispatcher, DispatchStatus
 
 
@@ -221,11 +222,61 @@ def test_virtual_path_typecasts_to_int(harness):
     harness.fs.www.mk(('%year.int/foo.html', "Greetings, program!"),)
     assert_virtvals(harness, '/1999/foo.html', {'year': [1999]})
 
-def test_virtual_path_raises_on_bad_typecast(harness):
+def test_virtual_path_is_missing_on_invalid_typed_value(harness):
     harness.fs.www.mk(('%year.int/foo.html', "Greetings, program!"),)
+    assert_missing(harness, '/I am not a year./foo.html')
+
+def test_virtual_path_raises_on_bad_typecast(harness):
+    harness.fs.www.mk(('%year.year/foo.html', "Greetings, program!"),)
+    harness.hydrate_request_processor(typecasters={'year': lambda s, state: int(s)})
     with pytest.raises(aspen.exceptions.TypecastError):
         assert_fs(harness, '/I am not a year./foo.html', '')
 
+def test_virtual_path_invalid_typed_value_falls_through_to_wildleaf(harness):
+    harness.fs.www.mk( ('%year.int/foo.html', "Greetings, program!")
+                     , ('%slug.spt', NEGOTIATED_SIMPLATE)
+                      )
+    assert_fs(harness, '/1999/foo.html', '%year.int/foo.html')
+    assert_fs(harness, '/nineteen-ninety-nine', '%slug.spt')
+
+def test_virtual_path_file_invalid_typed_value_falls_through_to_untyped_wildleaf(harness):
+    harness.fs.www.mk( ('foo/%id.int.json.spt', "[---]\n[---] application/json\n{}")
+                     , ('foo/%slug.spt', NEGOTIATED_SIMPLATE)
+                      )
+    assert_fs(harness, '/foo/42.json', 'foo/%id.int.json.spt')
+    assert_fs(harness, '/foo/bar.json', 'foo/%slug.spt')
+
+def test_virtual_path_file_is_missing_on_invalid_typed_value(harness):
+    harness.fs.www.mk(('foo/%bar.int.html.spt', NEGOTIATED_SIMPLATE),)
+    assert_missing(harness, '/foo/abc.html')
+
+def test_typecaster_validator_can_be_a_predicate(harness):
+    harness.fs.www.mk(('%year.year/foo.html', "Greetings, program!"),)
+    year = typecasting.with_validator(
+        lambda s: len(s) == 4 and s.isdigit(), lambda s, state: int(s)
+    )
+    harness.hydrate_request_processor(typecasters={'year': year})
+    assert_virtvals(harness, '/1999/foo.html', {'year': [1999]})
+    assert_missing(harness, '/199/foo.html')
+
+@pytest.mark.parametrize('value', ['0', '-12', '+3', ' 4 ', '\u0661'])
+def test_int_validator_accepts_what_int_accepts(value):
+    int(value)
+    assert typecasting.get_validator(typecasting.defaults['int'])(value)
+
+@pytest.mark.parametrize('value', ['', 'abc', '1.5', '1e3', '0x10'])
+def test_int_validator_rejects_junk(value):
+    assert not typecasting.get_validator(typecasting.defaults['int'])(value)
+
+@pytest.mark.parametrize('value', ['0', '-1.5', '.5', '5.', '1e3', '1.5E-3', 'inf', '-Infinity', 'nan'])
+def test_float_validator_accepts_what_float_accepts(value):
+    float(value)
+    assert typecasting.get_validator(typecasting.defaults['float'])(value)
+
+@pytest.mark.parametrize('value', ['', 'abc', '.', 'e3', '1.5.3'])
+def test_float_validator_rejects_junk(value):
+    assert not typecasting.get_validator(typecasting.defaults['float'])(value)
+
 def test_virtual_path_raises_on_direct_access(harness):
     assert_missing(harness, '/%name/foo.html')
 
@@ -301,6 +352,91 @@ def test_virtual_path_file_key_val_cast_custom(harness):
             return_after='apply_typecasters_to_path')
     assert actual['user'].username == 'chad'
 
+def test_dispatch_result_has_typecasts_for_typed_wildcards(harness):
+    harness.fs.www.mk(('%year.int/%slug.html.spt', NEGOTIATED_SIMPLATE),)
+    typecasts = dispatch(harness, '/1999/foo.html').typecasts
+    assert [t[:2] for t in typecasts] == [('year.int', 'year')]
+    assert typecasts[0][2] is harness.request_processor.typecasters['int']
+
+def test_dispatch_result_has_no_typecasts_for_untyped_wildcards(harness):
+    harness.fs.www.mk(('%bar/foo.html', "Greetings, program!"),)
+    assert dispatch(harness, '/blah/foo.html').typecasts == []
+
+def test_dispatch_result_has_typecasts_for_typed_wildleafs(harness):
+    harness.fs.www.mk(('foo/%bar.int.html.spt', NEGOTIATED_SIMPLATE),)
+    typecasts = dispatch(harness, '/foo/537.html').typecasts
+    assert [t[:2] for t in typecasts] == [('bar.int', 'bar')]
+
+def test_typecasts_only_apply_to_wildcards(harness):
+    harness.fs.www.mk(('%bar/foo.html', "Greetings, program!"),)
+    path = harness.simple(filepath=None, uripath='/blah;x.int=1/foo.html', want='path')
+    assert path == {'bar': ['blah']}
+
+# memoized cast
+
+def test_memoized_typecaster_skips_repeated_lookups(harness):
+    calls = []
+    def to_user(name, context):
+        calls.append(name)
+        return User(name)
+    to_user = typecasting.MemoizedTypecaster(to_user)
+    harness.fs.www.mk(('user/%user.user.html.spt', "[---]\n[---] text/plain\nhi"),)
+    harness.hydrate_request_processor(typecasters={'user': to_user})
+    for i in range(3):
+        actual = harness.simple(filepath=None, uripath='/user/chad.html', want='path',
+                return_after='apply_typecasters_to_path')
+        assert actual['user'].username == 'chad'
+    assert calls == ['chad']
+    assert (to_user.hits, to_user.misses) == (2, 1)
+
+def test_memoized_typecaster_expires_values():
+    now = [0]
+    typecaster = typecasting.MemoizedTypecaster(lambda s, state: object(), ttl=10)
+    typecaster.clock = lambda: now[0]
+    first = typecaster('foo', {})
+    now[0] = 9
+    assert typecaster('foo', {}) is first
+    now[0] = 10
+    assert typecaster('foo', {}) is not first
+    assert (typecaster.hits, typecaster.misses) == (1, 2)
+
+def test_memoized_typecaster_is_bounded():
+    typecaster = typecasting.MemoizedTypecaster(lambda s, state: s, maxsize=2)
+    for s in 'abc':
+        typecaster(s, {})
+    assert len(typecaster) == 2
+
+def test_memoized_typecaster_can_be_invalidated_and_cleared():
+    typecaster = typecasting.MemoizedTypecaster(lambda s, state: object())
+    first = typecaster('foo', {})
+    typecaster.invalidate('foo')
+    typecaster.invalidate('bar')
+    assert typecaster('foo', {}) is not first
+    typecaster.clear()
+    assert len(typecaster) == 0
+    assert (typecaster.hits, typecaster.misses) == (0, 0)
+
+def test_memoized_typecaster_does_not_memoize_errors(harness):
+    calls = []
+    def to_int(s, state):
+        calls.append(s)
+        return int(s)
+    harness.fs.www.mk(('%year.year/foo.html', "Greetings, program!"),)
+    harness.hydrate_request_processor(
+        typecasters={'year': typecasting.MemoizedTypecaster(to_int)}
+    )
+    for i in range(2):
+        with pytest.raises(aspen.exceptions.TypecastError):
+            harness.simple(filepath=None, uripath='/nope/foo.html')
+    assert calls == ['nope', 'nope']
+
+def test_memoized_typecaster_keeps_the_validator(harness):
+    int_ = typecasting.MemoizedTypecaster(typecasting.defaults['int'])
+    assert int_.validator is typecasting.defaults['int'].validator
+    harness.fs.www.mk(('%year.int/foo.html', "Greetings, program!"),)
+    harness.hydrate_request_processor(typecasters={'int': int_})
+    assert_missing(harness, '/nope/foo.html')
+
 # negotiated *and* virtual paths
 # ==============================
 
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import io
 
+import pytest
 from pytest import raises
 
 from aspen.simplates import json_
@@ -161,6 +162,50 @@ def test_aspen_json_dumps_dumps():
     "cheese": "puffs"
 }'''
 
+def _json_renderer(content, offset=2):
+    from aspen.simplates.simplate import Simplate
+    return Simplate.renderer_factories['json_dump']('foo.json.spt', content, 'application/json', offset)
+
+def test_json_compiles_the_expression_once():
+    renderer = _json_renderer("{'n': n}")
+    assert renderer.compiled.co_filename == 'foo.json.spt'
+    assert not renderer._constant
+
+def test_json_caches_the_output_of_constant_expressions(harness):
+    renderer = _json_renderer("{'Greetings': ['program!', 1, 2.5, True, None]}")
+    assert renderer._constant
+    output = harness.simple( "[---]\n[---] application/json\n{'Greetings': 'program!'}"
+                           , filepath="foo.json.spt", want='output'
+                            )
+    assert output.media_type == 'application/json'
+    context = {'output': output, 'request_processor': harness.request_processor}
+    first = renderer(context)
+    assert renderer._json == first
+    assert renderer(context) is first
+
+@pytest.mark.parametrize('content', ["{'n': n}", "{1, 2}", "[b'bytes']", "complex(1, 2)"])
+def test_json_doesnt_cache_expressions_that_arent_plain_constants(content):
+    assert not _json_renderer(content)._constant
+
+def test_json_tracebacks_point_at_the_simplate(harness):
+    harness.fs.www.mk(('foo.json.spt', "[---]\n[---] application/json\n\n{'a': 1/0}"),)
+    with raises(ZeroDivisionError) as e:
+        harness.simple(filepath=None, uripath='/foo.json')
+    frame = e.traceback[-1]
+    assert str(frame.path).endswith('foo.json.spt')
+    assert frame.lineno + 1 == 4
+
+def test_json_syntax_errors_are_raised_when_rendering(harness):
+    harness.fs.www.mk(( 'foo.spt'
+                      , "[---]\n[---] text/plain\nGreetings!\n[---] application/json\n{'a': }"
+                       ),)
+    assert harness.simple(filepath=None, uripath='/foo.txt').text == "Greetings!\n"
+    with raises(SyntaxError):
+        harness.simple(filepath=None, uripath='/foo.json')
+
+def test_json_strips_leading_whitespace_like_eval():
+    assert _json_renderer("  {'n': 1}", offset=0)._constant
+
 # jsonp
 
 JSONP_SIMPLATE = """[---]\n[---] application/json via jsonp_dump
@@ -193,3 +238,149 @@ def test_jsonp_filters_disallowed_chars(harness):
     assert actual == JSONP_RESULT, "wanted %r got %r " % (JSONP_RESULT, actual)
 
 
+
+
+# compact
+
+def test_json_can_be_compact(harness):
+    actual = harness.simple( "[---]\n[---] application/json\n{'b': [1, 2, None]}"
+                           , filepath="foo.json.spt"
+                           , request_processor_configuration={'json_compact': True}
+                            ).text
+    assert actual == '{"b":[1,2,null]}'
+
+def test_compact_json_honors_registered_encoders(harness):
+    actual = harness.simple('''
+        import datetime
+        [---]
+        [---] application/json
+        [datetime.date(2011, 5, 9), complex(1, 2)]
+    ''', filepath="foo.json.spt", request_processor_configuration={'json_compact': True}).text
+    assert actual == '["2011-05-09",[1.0,2.0]]'
+
+def test_compact_json_raises_TypeError_on_unknown_types(harness):
+    raises( TypeError
+          , harness.simple
+          , contents='[---]\nclass Foo: pass\n[---] application/json\nFoo()'
+          , filepath='foo.json.spt'
+          , request_processor_configuration={'json_compact': True}
+           )
+
+def test_compact_jsonp(harness):
+    actual = harness.simple( JSONP_SIMPLATE, filepath='index.json.spt', querystring='jsonp=foo'
+                           , request_processor_configuration={'json_compact': True}
+                            ).text
+    assert actual == '/**/ foo({"Greetings":"program!"});'
+
+
+# streaming
+
+STREAMING_SIMPLATE = """\
+[---]
+rows = ({'id': i, 'name': 'row %i' % i} for i in range(n))
+[---] application/json via json_stream
+{'count': n, 'rows': rows}
+"""
+
+def _stream(harness, n, **kw):
+    harness.fs.www.mk(('rows.spt', STREAMING_SIMPLATE.replace('range(n)', 'range(%i)' % n)
+                                                     .replace("'count': n", "'count': %i" % n)),)
+    return harness.simple(filepath=None, uripath='/rows.json', want='output', **kw)
+
+def test_json_stream_body_is_an_iterable_of_bytes(harness):
+    output = _stream(harness, 3)
+    assert output.media_type == 'application/json'
+    assert output.charset == 'UTF-8'
+    chunks = list(output.body)
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+    assert b''.join(chunks).decode('ascii') == json_.dumps(
+        {'count': 3, 'rows': [{'id': i, 'name': 'row %i' % i} for i in range(3)]}
+    )
+
+def test_json_stream_handles_empty_generators(harness):
+    assert json_.loads(b''.join(_stream(harness, 0).body).decode('ascii')) == \
+           {'count': 0, 'rows': []}
+
+def test_json_stream_can_be_compact(harness):
+    output = _stream(harness, 2, request_processor_configuration={'json_compact': True})
+    assert b''.join(output.body) == \
+           b'{"count":2,"rows":[{"id":0,"name":"row 0"},{"id":1,"name":"row 1"}]}'
+
+def test_json_iterdumps_consumes_iterators_lazily():
+    consumed = []
+    def rows():
+        for i in range(1000):
+            consumed.append(i)
+            yield i
+    chunks = json_.iterdumps(rows(), json_.streaming_encoder(compact=True), chunk_size=100)
+    first = next(chunks)
+    assert first.startswith(b'[0,1,2,')
+    assert len(consumed) < 100
+    assert json_.loads((first + b''.join(chunks)).decode('ascii')) == list(range(1000))
+
+def test_json_iterdumps_honors_registered_encoders():
+    import datetime
+    dates = (datetime.date(2011, 5, i) for i in (9, 10))
+    assert b''.join(json_.iterdumps(dates, json_.streaming_encoder(compact=True))) == \
+           b'["2011-05-09","2011-05-10"]'
+
+def test_json_stream_raises_TypeError_on_unknown_types(harness):
+    harness.fs.www.mk(('foo.spt', "[---]\n[---] application/json via json_stream\nobject()"),)
+    output = harness.simple(filepath=None, uripath='/foo.json', want='output')
+    with raises(TypeError):
+        list(output.body)
+
+def test_json_stream_is_not_prerendered(harness):
+    harness.fs.www.mk(('foo.spt', """\
+__constant__ = True
+[---]
+[---] application/json via json_stream
+[1, 2, 3]"""),)
+    output = harness.simple(filepath=None, uripath='/foo.json', want='output')
+    assert json_.loads(b''.join(output.body).decode('ascii')) == [1, 2, 3]
+    resource = harness.simple(filepath=None, uripath='/foo.json', want='resource')
+    assert resource.prerendered == {}
+
+
+# encoders
+
+def test_json_encoders_apply_to_subclasses():
+    import datetime
+    class Birthday(datetime.date):
+        pass
+    assert json_.dumps([Birthday(2011, 5, 9)]) == '[\n    "2011-05-09"\n]'
+
+def test_json_encoders_of_subclasses_win():
+    import datetime
+    class Birthday(datetime.date):
+        pass
+    json_.register_encoder(Birthday, lambda obj: 'birthday')
+    try:
+        assert json_.dumps([Birthday(2011, 5, 9), datetime.date(2011, 5, 9)]) == \
+               '[\n    "birthday",\n    "2011-05-09"\n]'
+    finally:
+        json_.unregister_encoder(Birthday)
+    assert json_.get_encoder(Birthday) is json_.get_encoder(datetime.date)
+
+def test_json_encoder_lookup_is_memoized_and_invalidated():
+    class Foo(object):
+        pass
+    class Bar(Foo):
+        pass
+    assert json_.get_encoder(Bar) is None
+    json_.register_encoder(Foo, lambda obj: 'foo')
+    try:
+        assert json_.get_encoder(Bar) is json_.encoders[Foo]
+        assert json_.dumps(Bar()) == '"foo"'
+    finally:
+        json_.unregister_encoder(Foo)
+    assert json_.get_encoder(Bar) is None
+    raises(TypeError, json_.dumps, Bar())
+
+def test_json_encodes_containers_as_arrays():
+    from collections import deque
+    d = {'a': 1}
+    payload = [{1}, frozenset([2]), deque([3]), range(4, 5), d.keys(), d.values(), d.items()]
+    assert json_.loads(json_.dumps(payload)) == [[1], [2], [3], [4], ['a'], [1], [['a', 1]]]
+    assert json_.loads(json_.compact_encoder()(payload)) == \
+           [[1], [2], [3], [4], ['a'], [1], [['a', 1]]]
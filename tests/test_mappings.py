@@ -143,3 +143,23 @@ def test_mapping_popall_removes_the_item():
     m['foo'] = 3
     m.popall('foo')
     assert 'foo' not in m
+
+def test_mapping_add_creates_a_list_for_a_new_key():
+    m = Mapping()
+    m.add('foo', 1)
+    assert dict.__getitem__(m, 'foo') == [1]
+
+def test_mapping_add_appends_to_the_stored_list():
+    m = Mapping()
+    m['foo'] = 1
+    values = m.all('foo')
+    m.add('foo', 2)
+    assert values == [1, 2]
+    assert m.get('foo') == 2
+
+def test_mapping_get_returns_falsy_values():
+    m = Mapping()
+    m['foo'] = None
+    m['bar'] = 0
+    assert m.get('foo', 'cheese') is None
+    assert m.get('bar', 'cheese') == 0
@@ -3,11 +3,18 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+from string import Template
+import subprocess
+import sys
+
 from six import text_type as str
 
+import pytest
 from pytest import raises
 
 from aspen.simplates import json_
+from aspen.simplates import renderers
 from aspen.simplates.renderers import Factory, Renderer
 from aspen.simplates.simplate import Simplate
 
@@ -101,9 +108,295 @@ def test_renderer_padding_achieves_correct_line_numbers_in_tracebacks(harness):
     assert 'line 3' in actual
 
 
+# changes_reload
+
+class CountingRenderer(Renderer):
+
+    def compile(self, filepath, padded):
+        self._compiles = getattr(self, '_compiles', 0) + 1
+        return padded
+
+    def render_content(self, context):
+        return '%s %s' % (self.meta, self._compiles)
+
+class CountingFactory(Factory):
+    Renderer = CountingRenderer
+
+    def compile_meta(self, configuration):
+        self._metas = getattr(self, '_metas', 0) + 1
+        return configuration.media_type_default
+
+def _reloading_factory(harness):
+    harness.hydrate_request_processor(changes_reload=True)
+    factory = CountingFactory(harness.request_processor)
+    return factory, factory('index.spt', 'Greetings, program!', 'text/plain', 2)
+
+def test_renderers_dont_recompile_when_nothing_changed(harness):
+    factory, renderer = _reloading_factory(harness)
+    for i in range(3):
+        assert renderer({}) == 'text/plain 1'
+    assert factory._metas == 1
+
+def test_renderers_recompile_when_the_configuration_changes(harness):
+    factory, renderer = _reloading_factory(harness)
+    assert renderer({}) == 'text/plain 1'
+    harness.request_processor.media_type_default = 'text/html'
+    assert renderer({}) == 'text/html 2'
+    assert renderer({}) == 'text/html 2'
+    assert factory._metas == 2
+
+def test_renderers_can_ask_to_be_recompiled(harness):
+    factory, renderer = _reloading_factory(harness)
+    renderer.needs_recompile = lambda: True
+    assert renderer({}) == 'text/plain 2'
+    assert renderer({}) == 'text/plain 3'
+
+def test_factories_can_disable_meta_recompilation(harness):
+    class StaticMetaFactory(CountingFactory):
+        def meta_signature(self, configuration):
+            return None
+    harness.hydrate_request_processor(changes_reload=True)
+    factory = StaticMetaFactory(harness.request_processor)
+    renderer = factory('index.spt', 'Greetings, program!', 'text/plain', 2)
+    harness.request_processor.media_type_default = 'text/html'
+    assert renderer({}) == 'text/plain 1'
+
+def test_meta_doesnt_change_while_serving_requests(harness):
+    harness.hydrate_request_processor(changes_reload=True)
+    harness.fs.www.mk(('index.spt', "[---]\n[---] text/plain via stdlib_format\n{path.raw}"),)
+    harness.request_processor.dispatcher.build_dispatch_tree()
+    for i in range(3):
+        assert harness.simple(filepath=None).text == '/'
+    factory = Simplate.renderer_factories['stdlib_format']
+    assert factory._meta_version == 0
+
+
+# interning
+
+def _renderer_of(harness, uripath, media_type='text/plain'):
+    resource = harness.simple(filepath=None, uripath=uripath, want='resource')
+    return resource.renderers[media_type]
+
+def test_identical_pages_share_a_renderer(harness):
+    harness.fs.www.mk( ('foo.spt', "[---]\nfoo = 1\n[---] text/plain\n%(foo)s")
+                     , ('bar.spt', "[---]\nfoo = 2\n[---] text/plain\n%(foo)s")
+                      )
+    assert _renderer_of(harness, '/foo') is _renderer_of(harness, '/bar')
+    assert harness.simple(filepath=None, uripath='/bar').text == '2'
+
+def test_pages_at_different_offsets_dont_share_a_renderer(harness):
+    harness.fs.www.mk( ('foo.spt', "[---]\nfoo = 1\n[---] text/plain\n%(foo)s")
+                     , ('bar.spt', "[---]\nfoo = 2\n\n[---] text/plain\n%(foo)s")
+                      )
+    assert _renderer_of(harness, '/foo') is not _renderer_of(harness, '/bar')
+
+def test_json_pages_dont_share_a_renderer(harness):
+    harness.fs.www.mk( ('foo.spt', "[---]\nfoo = 1\n[---] application/json\nfoo")
+                     , ('bar.spt', "[---]\nfoo = 2\n[---] application/json\nfoo")
+                      )
+    foo = _renderer_of(harness, '/foo.json', 'application/json')
+    bar = _renderer_of(harness, '/bar.json', 'application/json')
+    assert foo is not bar
+    assert foo.compiled.co_filename != bar.compiled.co_filename
+
+def test_interned_renderers_are_released(harness):
+    import gc
+    factory = Simplate.renderer_factories['stdlib_format']
+    renderer = factory('foo.spt', '{foo}', 'text/plain', 2)
+    assert factory('bar.spt', '{foo}', 'text/plain', 2) is renderer
+    assert len(factory._renderers) == 1
+    del renderer
+    gc.collect()
+    assert len(factory._renderers) == 0
+
+
 def test_aspen_renderers_is_deprecated(harness):
     import warnings
     with warnings.catch_warnings(record=True) as w:
         assert w == []
         from aspen import renderers; renderers  # (; for pyflakes)
         assert [x.category for x in w] == [FutureWarning]
+
+
+# registry
+
+class FakeEntryPoint(object):
+
+    def __init__(self, name, module=None):
+        self.name = name
+        self.module = module
+        self.loaded = 0
+
+    def load(self):
+        self.loaded += 1
+        if self.module is None:
+            raise ImportError("No module named %s" % self.name)
+        return self.module
+
+class FakeModule(object):
+    Factory = Factory
+
+@pytest.fixture
+def fake_entry_points(monkeypatch):
+    eps = { 'fake': FakeEntryPoint('fake', FakeModule)
+          , 'broken': FakeEntryPoint('broken')
+           }
+    monkeypatch.setattr(renderers, '_entry_points', eps)
+    return eps
+
+def test_importing_renderers_doesnt_discover_entry_points():
+    script = ( "import sys\n"
+               "import aspen.simplates.renderers as renderers\n"
+               "assert renderers._entry_points is None\n"
+               "assert 'pkg_resources' not in sys.modules\n"
+              )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.check_call([sys.executable, '-c', script], cwd=root)
+
+def test_RENDERERS_discovers_entry_points_on_first_read(monkeypatch):
+    calls = []
+    def iter_entry_points(group):
+        calls.append(group)
+        return [FakeEntryPoint('fake', FakeModule)]
+    monkeypatch.setattr(renderers, '_entry_points', None)
+    monkeypatch.setattr(renderers, '_iter_entry_points', iter_entry_points)
+    names = renderers.RendererNames()
+    assert calls == []
+    assert 'fake' in names
+    assert calls == ['aspen.renderers']
+    assert list(names) == sorted(renderers.BUILTIN_RENDERERS + ['fake'])
+    assert calls == ['aspen.renderers']
+
+def test_renderer_factories_are_loaded_lazily(harness):
+    factories = renderers.factories(harness.request_processor)
+    assert factories._factories == {}
+    assert 'stdlib_format' in factories
+    assert factories._factories == {}
+    assert isinstance(factories['stdlib_format'], renderers.Factory)
+    assert list(factories._factories) == ['stdlib_format']
+    assert factories['stdlib_format'] is factories['stdlib_format']
+
+def test_renderer_factories_include_the_builtins(harness):
+    factories = renderers.factories(harness.request_processor)
+    assert set(renderers.BUILTIN_RENDERERS).issubset(factories)
+    assert set(renderers.BUILTIN_RENDERERS).issubset(renderers.renderer_names())
+    assert renderers.RENDERERS == renderers.renderer_names()
+    with raises(KeyError):
+        factories['nonexistent']
+    assert factories.get('nonexistent') is None
+
+def test_renderer_factories_load_entry_points_on_first_use(harness, fake_entry_points):
+    factories = renderers.factories(harness.request_processor)
+    assert 'fake' in factories
+    assert fake_entry_points['fake'].loaded == 0
+    assert isinstance(factories['fake'], Factory)
+    factories['fake']
+    assert fake_entry_points['fake'].loaded == 1
+
+def test_renderer_factories_hold_import_errors(harness, fake_entry_points):
+    factories = renderers.factories(harness.request_processor)
+    err = factories['broken']
+    assert isinstance(err, ImportError)
+    assert err.info[0] is ImportError
+
+def test_simplates_raise_import_errors_of_renderers(harness, fake_entry_points):
+    harness.hydrate_request_processor()
+    with raises(ImportError):
+        harness.simple("[---]\n[---] text/plain via broken\nGreetings, program!")
+
+def test_renderer_factories_can_be_extended(harness):
+    factories = renderers.factories(harness.request_processor)
+    factories['custom'] = 'foo'
+    assert factories['custom'] == 'foo'
+    assert 'custom' in list(factories)
+    del factories['custom']
+    assert 'custom' not in factories
+    with raises(KeyError):
+        del factories['custom']
+
+
+def _names(harness, renderer, content):
+    factory = Simplate.renderer_factories[renderer]
+    return factory('', content, 'text/plain', 0).referenced_names()
+
+def test_stdlib_format_referenced_names(harness):
+    assert _names(harness, 'stdlib_format', '{foo} {bar.baz} {buz[0]!r:>4} {{}}') == \
+           {'foo', 'bar', 'buz'}
+    assert _names(harness, 'stdlib_format', '{0}') is None
+    assert _names(harness, 'stdlib_format', '{foo:{width}}') is None
+
+def test_stdlib_percent_referenced_names(harness):
+    assert _names(harness, 'stdlib_percent', '%(foo)s %(bar)-4d 100%%') == {'foo', 'bar'}
+    assert _names(harness, 'stdlib_percent', '%s') is None
+    assert _names(harness, 'stdlib_percent', '100%') is None
+
+def test_stdlib_template_referenced_names(harness):
+    assert _names(harness, 'stdlib_template', '$foo ${bar} $$') == {'foo', 'bar'}
+    assert _names(harness, 'stdlib_template', '$') is None
+
+def test_json_dump_referenced_names_are_unknown(harness):
+    assert _names(harness, 'json_dump', '{"foo": 1}') is None
+
+
+# compiled segments
+
+CONTEXT = {'foo': 'Foo', 'bar': 1.5, 'baz': [0, 'zero'], 'n': 42, 'path': {'x': 'y'}}
+
+def _render(renderer, content, offset=3, context=CONTEXT):
+    factory = Simplate.renderer_factories[renderer]
+    r = factory('', content, 'text/plain', offset)
+    return r, r(dict(context))
+
+@pytest.mark.parametrize('content', [
+    '', '\n\nfoo\n', '{foo}', '{{{foo}}}\n', '{foo!r:>10} {bar:.3f} {baz[1]} {foo.lower}',
+    '{n:#x} {n:,} {foo} {foo} 100%', '\n{path[x]}\n\n',
+])
+def test_stdlib_format_compiled_output_is_identical(harness, content):
+    r, actual = _render('stdlib_format', content)
+    assert not r._strip_padding
+    assert actual == content.format(**CONTEXT)
+
+@pytest.mark.parametrize('content', [
+    '', '\n\nfoo\n', '%(foo)s', '%(foo)r %(bar)08.2f %(n)-5d|', '100%% %(foo)s%%\n',
+    '%(n)x %(n)o %(bar)e %(foo)s %(foo)s',
+])
+def test_stdlib_percent_compiled_output_is_identical(harness, content):
+    r, actual = _render('stdlib_percent', content)
+    assert not r._strip_padding
+    assert actual == content % CONTEXT
+
+@pytest.mark.parametrize('content', [
+    '', '\n\nfoo\n', '$foo', '${foo}bar $$foo 100% %s %(foo)s', '$n$bar\n$baz',
+])
+def test_stdlib_template_compiled_output_is_identical(harness, content):
+    r, actual = _render('stdlib_template', content)
+    assert not r._strip_padding
+    assert actual == Template(content).substitute(CONTEXT)
+
+@pytest.mark.parametrize('renderer,content,expected', [
+    ('stdlib_format', '{0}', IndexError),
+    ('stdlib_format', '{foo:{n}}', '{:{}}'.format('Foo', 42)),
+    ('stdlib_format', '{', ValueError),
+    ('stdlib_percent', '%s', "%s" % CONTEXT),
+    ('stdlib_percent', '%(n)*d', TypeError),
+    ('stdlib_percent', '100%', ValueError),
+    ('stdlib_template', 'Greetings, $!', ValueError),
+])
+def test_uncompilable_content_falls_back(harness, renderer, content, expected):
+    if isinstance(expected, type):
+        with raises(expected):
+            _render(renderer, content)
+    else:
+        r, actual = _render(renderer, content)
+        assert r._strip_padding
+        assert actual == expected
+
+@pytest.mark.parametrize('renderer,content', [
+    ('stdlib_format', '{foo} {missing}'),
+    ('stdlib_percent', '%(foo)s %(missing)s'),
+    ('stdlib_template', '$foo $missing'),
+])
+def test_compiled_renderers_raise_KeyError_for_missing_names(harness, renderer, content):
+    with raises(KeyError) as e:
+        _render(renderer, content)
+    assert e.value.args == ('missing',)
@@ -4,8 +4,16 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from six import text_type
+from six.moves.urllib.parse import parse_qs
 
-from aspen.http.request import Path, Querystring
+import pytest
+
+from aspen.exceptions import RangeNotSatisfiable, TooManyParameters, URITooLong
+from aspen.http import request
+from aspen.http.request import (
+    EMPTY, Path, Querystring, UnparsedQuerystring, parse_byte_ranges, path_decode,
+    set_path_decode_cache_size, split_path_no_params,
+)
 
 
 # Path
@@ -44,6 +52,41 @@ def test_path_has_parts():
     assert path.parts == ['foo', 'bar.html']
 
 
+# path_decode
+# ===========
+
+@pytest.fixture
+def count_unquotes(monkeypatch):
+    calls = []
+    unquote_path = request._unquote_path
+    def _unquote_path(bs):
+        calls.append(bs)
+        return unquote_path(bs)
+    monkeypatch.setattr(request, '_unquote_path', _unquote_path)
+    yield calls
+    set_path_decode_cache_size(1024)
+
+def test_path_decode_returns_strings_without_escapes_as_is(count_unquotes):
+    set_path_decode_cache_size(0)
+    assert path_decode("foo+bar.html") == "foo+bar.html"
+    assert isinstance(path_decode("foo"), text_type)
+    assert count_unquotes == []
+
+def test_path_decode_caches_strings_with_escapes(count_unquotes):
+    set_path_decode_cache_size(2)
+    assert path_decode("%E2%98%83") == path_decode("%E2%98%83") == "\u2603"
+    assert count_unquotes == ["%E2%98%83"]
+    path_decode("%41")
+    path_decode("%42")
+    assert path_decode("%E2%98%83") == "\u2603"
+    assert count_unquotes == ["%E2%98%83", "%41", "%42", "%E2%98%83"]
+
+def test_path_decode_cache_can_be_disabled(count_unquotes):
+    set_path_decode_cache_size(0)
+    assert path_decode("%41") == path_decode("%41") == "A"
+    assert count_unquotes == ["%41", "%41"]
+
+
 # Path params
 # ===========
 
@@ -79,6 +122,62 @@ def test_path_params_api():
     assert path.parts[1].params == params[1]
 
 
+@pytest.mark.parametrize('raw', [
+    '/', '', 'foo', '//foo', '/foo//bar/', '/%2F/%e2%98%84', '/foo;a=1/%e2%98%84',
+    '/;', '/foo;/bar', '/a+b/c%20d',
+])
+def test_path_decoded_is_the_same_as_decoding_the_raw_path(raw):
+    assert Path(raw).decoded == path_decode(raw)
+    assert Path(raw, split_path=split_path_no_params).decoded == path_decode(raw)
+
+def test_path_parts_without_params_have_lazy_params():
+    path = Path("/foo/bar")
+    assert [part._params for part in path.parts] == [EMPTY, EMPTY]
+    path.parts[0].params.add('a', '1')
+    assert path.parts[0].params == {'a': ['1']}
+    assert path.parts[1].params == {}
+    assert path.parts[0].params is path.parts[0].params
+
+def test_path_parts_mixed_with_and_without_params():
+    path = Path("/foo/bar;a=1/baz")
+    assert [part.params for part in path.parts] == [{}, {'a': ['1']}, {}]
+    assert path.parts == ['foo', 'bar', 'baz']
+
+def test_path_parts_without_params_can_be_pickled():
+    import pickle
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        part = pickle.loads(pickle.dumps(Path("/foo").parts[0], protocol))
+        assert part == 'foo'
+        assert part.params == {}
+
+def test_split_path_no_params_has_no_params():
+    path = Path("/foo;a=1/bar", split_path=split_path_no_params)
+    assert path.parts == ['foo;a=1', 'bar']
+    assert [part.params for part in path.parts] == [None, None]
+
+def test_path_raises_URITooLong_when_too_long():
+    with pytest.raises(URITooLong) as info:
+        Path("/" + "a" * 100, max_length=100)
+    assert info.value.code == 414
+    assert Path("/" + "a" * 99, max_length=100).parts == ["a" * 99]
+
+def test_path_raises_URITooLong_when_too_many_segments():
+    with pytest.raises(URITooLong):
+        Path("/a" * 11, max_segments=10)
+    assert len(Path("/a" * 10, max_segments=10).parts) == 10
+
+def test_path_raises_TooManyParameters_when_a_segment_has_too_many_params():
+    with pytest.raises(TooManyParameters) as info:
+        Path("/foo/bar;a=1;b=2;c=3", max_params=2)
+    assert info.value.code == 400
+    assert str(info.value) == "number of path segment parameters exceeds the limit of 2"
+    assert Path("/foo;a=1;b=2/bar;c=3", max_params=2).parts[0].params == {'a': ['1'], 'b': ['2']}
+
+def test_path_max_params_doesnt_apply_to_split_path_no_params():
+    path = Path("/foo;a=1;b=2", split_path=split_path_no_params, max_params=1)
+    assert path.parts == ['foo;a=1;b=2']
+
+
 # Querystring
 # ===========
 
@@ -118,3 +217,135 @@ def test_querystring_unquotes_plus():
     querystring = Querystring("baz=+%2B")
     assert querystring.decoded == "baz= +", querystring.decoded
     assert querystring['baz'] == " +"
+
+def test_empty_querystring_is_empty():
+    querystring = Querystring("")
+    assert querystring == {}
+    assert querystring.raw == querystring.decoded == ""
+
+def test_querystring_decodes_lazily():
+    querystring = Querystring("baz=%e2%98%84")
+    assert querystring._decoded is None
+    assert querystring.decoded == "baz=\u2604"
+    assert querystring._decoded == "baz=\u2604"
+
+def test_querystring_decoded_can_be_set():
+    querystring = Querystring("baz=buz")
+    querystring.decoded = "foo"
+    assert querystring.decoded == "foo"
+
+def test_querystring_parses_lazily(monkeypatch):
+    calls = []
+    def parse(*a, **kw):
+        calls.append(a)
+        return parse_qs(*a, **kw)
+    monkeypatch.setattr(request, 'parse_qs', parse)
+    querystring = Querystring("baz=%e2%98%84")
+    assert isinstance(querystring, Querystring)
+    assert type(querystring) is UnparsedQuerystring
+    assert dict.__len__(querystring) == 0
+    assert querystring.raw == "baz=%e2%98%84"
+    assert querystring.decoded == "baz=\u2604"
+    assert calls == []
+    assert querystring['baz'] == "\u2604"
+    assert len(calls) == 1
+    assert type(querystring) is Querystring
+    assert querystring.get('baz') == "\u2604"
+    assert len(calls) == 1
+
+@pytest.mark.parametrize('read', [
+    lambda qs: qs['a'],
+    lambda qs: 'a' in qs,
+    lambda qs: list(qs),
+    lambda qs: list(qs.keys()),
+    lambda qs: list(qs.items()),
+    lambda qs: list(qs.values()),
+    lambda qs: qs.get('a'),
+    lambda qs: qs.all('a'),
+    lambda qs: len(qs),
+    lambda qs: qs == {},
+    lambda qs: repr(qs),
+    lambda qs: qs.copy(),
+    lambda qs: qs.pop('a'),
+    lambda qs: qs.add('b', '3'),
+])
+def test_querystring_is_parsed_by_any_read(read):
+    querystring = Querystring("a=1&a=2")
+    read(querystring)
+    assert type(querystring) is Querystring
+    assert dict.__len__(querystring) > 0
+
+def test_querystring_is_parsed_before_it_is_modified():
+    querystring = Querystring("a=1&b=2")
+    querystring['a'] = '3'
+    assert querystring == {'a': ['3'], 'b': ['2']}
+
+def test_unparsed_querystrings_compare_equal():
+    assert Querystring("a=1&b=2") == Querystring("a=1&b=2")
+    assert Querystring("a=1") != Querystring("a=2")
+
+@pytest.mark.parametrize('raw', [
+    "a", "a=", "=x", "=", "&&a=1&&a=2&", "a=1=2", "x&y=&z", "baz=buz&baz=bar",
+])
+def test_querystring_fast_path_matches_parse_qs(raw):
+    assert dict(Querystring(raw).items()) == parse_qs(raw, keep_blank_values=True)
+
+def test_querystring_raises_URITooLong_when_too_long():
+    with pytest.raises(URITooLong):
+        Querystring("a=" + "b" * 99, max_length=100)
+    assert Querystring("a=" + "b" * 98, max_length=100)['a'] == "b" * 98
+
+@pytest.mark.parametrize('raw', ["a=1&b=2&c=3", "a=%20&b&c"])
+def test_querystring_raises_TooManyParameters_when_too_many_pairs(raw):
+    with pytest.raises(TooManyParameters):
+        Querystring(raw, max_pairs=2)
+    assert len(Querystring(raw, max_pairs=3)) == len(parse_qs(raw, keep_blank_values=True))
+
+def test_querystring_max_pairs_counts_semicolons_only_if_parse_qs_splits_on_them():
+    raw = "a=1;b=2;c=3"
+    expected = len(parse_qs(raw, keep_blank_values=True))
+    if expected == 3:
+        with pytest.raises(TooManyParameters):
+            Querystring(raw, max_pairs=2)
+    else:
+        assert Querystring(raw, max_pairs=1)['a'] == '1;b=2;c=3'
+    assert len(Querystring(raw, max_pairs=3)) == expected
+
+
+# Range
+# =====
+
+@pytest.mark.parametrize('header,expected', [
+    ('bytes=0-0', [(0, 0)]),
+    ('bytes=0-99', [(0, 99)]),
+    ('bytes=900-', [(900, 999)]),
+    ('bytes=-100', [(900, 999)]),
+    ('bytes=-5000', [(0, 999)]),
+    ('bytes=990-5000', [(990, 999)]),
+    ('Bytes = 0-9 , 20-29,,-1', [(0, 9), (20, 29), (999, 999)]),
+    ('bytes=0-9,1000-1999', [(0, 9)]),
+    # ignored
+    ('items=0-9', None),
+    ('bytes', None),
+    ('bytes=', None),
+    ('bytes=9-0', None),
+    ('bytes=a-9', None),
+    ('bytes=0-9a', None),
+    ('bytes=-', None),
+    ('bytes=5', None),
+    ('bytes=\u0660-9', None),
+    ('bytes=' + ','.join(['0-1'] * 17), None),
+])
+def test_parse_byte_ranges(header, expected):
+    assert parse_byte_ranges(header, 1000, max_ranges=16) == expected
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=-0', 'bytes=1000-1999,2000-'])
+def test_parse_byte_ranges_raises_RangeNotSatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable) as info:
+        parse_byte_ranges(header, 1000)
+    assert info.value.code == 416
+    assert info.value.content_range == 'bytes */1000'
+
+def test_parse_byte_ranges_of_an_empty_file():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_byte_ranges('bytes=-10', 0)
@@ -5,7 +5,13 @@ from __future__ import unicode_literals
 
 import os
 
-from aspen.request_processor import RequestProcessor
+from pytest import raises
+
+from aspen.exceptions import TooManyParameters, URITooLong
+from aspen.http import request
+from aspen.http.request import UnparsedQuerystring
+from aspen.request_processor import RequestProcessor, algorithm
+from aspen.request_processor.dispatcher import DispatchStatus
 
 
 def test_basic():
@@ -29,3 +35,119 @@ def test_resources_can_import_from_project_root(harness):
     assert harness.simple( "from foo import bar\n[---]\n[---]\nGreetings, %(bar)s!"
                          , 'index.html.spt'
                          , raise_immediately=False).text == "Greetings, baz!"
+
+def test_media_type_tables_cover_aspens_mime_types():
+    rp = RequestProcessor()
+    assert rp.media_types_by_extension['ico'] == 'image/x-icon'
+    assert rp.accept_by_extension['ico'] == 'image/x-icon,image/icon'
+
+def test_media_type_tables_cover_the_projects_mime_types(harness):
+    harness.fs.project.mk(('mime.types', 'application/x-floober floober\n'))
+    rp = harness.hydrate_request_processor(project_root=harness.fs.project.root)
+    assert rp.guess_media_type('/foo.floober') == 'application/x-floober'
+    assert rp.get_accept_for_extension('floober') == \
+        'application/x-floober,application/floober'
+
+def test_guess_media_type_honors_media_type_json():
+    rp = RequestProcessor(media_type_json='application/vnd.foo+json')
+    assert rp.guess_media_type('/foo.json') == 'application/vnd.foo+json'
+    assert rp.get_accept_for_extension('json') == 'application/json,application/vnd.foo+json'
+
+def test_guess_media_type_falls_back_to_the_mimetypes_module():
+    rp = RequestProcessor()
+    assert rp.guess_media_type('/foo.tar.gz') == 'application/x-tar'
+    assert rp.guess_media_type('/foo.HTML') == 'text/html'
+    assert rp.guess_media_type('/foo.unknown-extension') is None
+    assert rp.get_accept_for_extension('unknown-extension') is None
+
+def test_parsing_limits_are_enforced_before_dispatch(harness):
+    harness.hydrate_request_processor(path_max_length=10, querystring_max_pairs=2)
+    def dispatch(*a, **kw):
+        raise AssertionError("dispatch shouldn't be reached")
+    harness.request_processor.dispatcher.dispatch = dispatch
+    with raises(URITooLong):
+        harness.request_processor.process('/' + 'a' * 10, '', None, raise_immediately=True)
+    with raises(TooManyParameters):
+        harness.request_processor.process('/', 'a&b&c', None, raise_immediately=True)
+
+def test_parsing_limits_can_be_disabled(harness):
+    harness.hydrate_request_processor(path_max_segments=None, querystring_max_length=None)
+    state = harness.request_processor.process(
+        '/a' * 1000, 'a=' + 'b' * 100000, None, return_after='hydrate_querystring'
+    )
+    assert len(state['path'].parts) == 1000
+    assert len(state['querystring']['a']) == 100000
+
+def test_hydration_functions_dont_require_a_request_processor():
+    assert algorithm.hydrate_path('/' + 'a/' * 1000)['path'].parts[0] == 'a'
+    assert algorithm.hydrate_querystring('a&' * 1000)['querystring']['a'] == ''
+
+def test_querystrings_that_arent_read_arent_parsed(harness, monkeypatch):
+    calls = []
+    monkeypatch.setattr(request, 'parse_qs', lambda *a, **kw: calls.append(a))
+    harness.fs.www.mk(('foo.txt', "Greetings, program!"))
+    rp = harness.request_processor
+    for i in range(2):
+        # the second request takes the static fast lane
+        state = rp.process('/foo.txt', 'a=%20', None)
+        assert type(state['querystring']) is UnparsedQuerystring
+    state = rp.process('/bar.txt', 'a=%20', None)
+    assert state['dispatch_result'].status == DispatchStatus.missing
+    assert type(state['querystring']) is UnparsedQuerystring
+    assert calls == []
+
+
+# Static fast lane
+# ================
+
+def test_static_files_take_the_fast_lane(harness):
+    harness.fs.www.mk(('foo.txt', "Greetings, program!"))
+    rp = harness.request_processor
+    state = rp.process('/foo.txt', 'a=1', None)
+    def dispatch(*a, **kw):
+        raise AssertionError("dispatch shouldn't be reached")
+    rp.dispatcher.dispatch = dispatch
+    fast_state = rp.process('/foo.txt', 'a=2', None, foo='bar')
+    assert sorted(fast_state) == sorted(list(state) + ['foo'])
+    assert fast_state['state'] is fast_state
+    assert fast_state['output'].body == b"Greetings, program!"
+    assert fast_state['output'].media_type == 'text/plain'
+    assert fast_state['output'] is not state['output']
+    assert fast_state['path'].decoded == '/foo.txt'
+    assert fast_state['querystring']['a'] == '2'
+    assert fast_state['dispatch_result'] == state['dispatch_result']
+    assert fast_state['resource'] is state['resource']
+
+def test_static_fast_lane_is_emptied_when_the_dispatch_tree_is_rebuilt(harness):
+    harness.fs.www.mk(('foo.txt', "Greetings, program!"))
+    rp = harness.request_processor
+    rp.process('/foo.txt', '', None)
+    assert '/foo.txt' in rp.get_static_routes()
+    rp.dispatcher.build_dispatch_tree()
+    assert '/foo.txt' not in rp.get_static_routes()
+
+def test_static_fast_lane_skips_dynamic_resources_and_wildcards(harness):
+    harness.fs.www.mk(('foo.spt', "[---]\n[---] text/plain\nfoo"), ('%bar/baz.txt', "baz"))
+    rp = harness.request_processor
+    rp.process('/foo', '', None)
+    rp.process('/bar/baz.txt', '', None)
+    assert len(rp.get_static_routes()) == 0
+
+def test_static_fast_lane_is_disabled_when_the_algorithm_is_modified(harness):
+    harness.fs.www.mk(('foo.txt', "Greetings, program!"))
+    rp = harness.request_processor
+    rp.algorithm.insert_after('encode_output', lambda: {'foo': 1})
+    assert rp.get_static_routes() is None
+    rp.process('/foo.txt', '', None)
+    assert rp.process('/foo.txt', '', None)['foo'] == 1
+
+def test_static_fast_lane_is_disabled_when_changes_reload_is_on(harness):
+    harness.hydrate_request_processor(changes_reload=True)
+    assert harness.request_processor.get_static_routes() is None
+
+def test_static_fast_lane_is_skipped_when_return_after_is_given(harness):
+    harness.fs.www.mk(('foo.txt', "Greetings, program!"))
+    rp = harness.request_processor
+    rp.process('/foo.txt', '', None)
+    state = rp.process('/foo.txt', '', None, return_after='dispatch_path_to_filesystem')
+    assert 'resource' not in state
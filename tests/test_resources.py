@@ -3,8 +3,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
 
+from aspen import resources
+from aspen.exceptions import RangeNotSatisfiable
+from aspen.http.resource import NOT_COMPUTED
+from aspen.output import Output
 from aspen.simplates.pagination import split
+import pytest
 from pytest import raises
 
 
@@ -39,6 +45,112 @@ def test_charset_static_None(harness):
     assert output.media_type == 'text/html'
     assert output.charset is None
 
+def test_static_files_arent_read_at_load_time(harness, monkeypatch):
+    harness.fs.www.mk(('index.html', 'Greetings, program!'))
+    def open(*a, **kw):
+        raise AssertionError("the file shouldn't be read")
+    monkeypatch.setattr(resources, 'open', open, raising=False)
+    resource = resources.load(harness.request_processor, harness.fs.www.resolve('index.html'))
+    assert resource.raw is None
+    assert resource.media_type == 'text/html'
+
+def test_static_files_are_read_at_load_time_when_stored_in_ram(harness):
+    harness.hydrate_request_processor(store_static_files_in_ram=True)
+    harness.fs.www.mk(('index.html', 'Greetings, program!'))
+    resource = resources.load(harness.request_processor, harness.fs.www.resolve('index.html'))
+    assert resource.raw == b'Greetings, program!'
+
+def test_charset_static_is_checked_lazily(harness):
+    harness.hydrate_request_processor(charset_static='utf8')
+    harness.fs.www.mk(('index.html', 'Greetings, program!'))
+    resource = resources.load(harness.request_processor, harness.fs.www.resolve('index.html'))
+    assert resource._charset is NOT_COMPUTED
+    assert resource.charset == 'utf8'
+
+def test_charset_static_is_checked_incrementally(harness):
+    harness.hydrate_request_processor(charset_static='utf8')
+    harness.fs.www.mk(('good.html', '\u2603' * 10, True, 'utf8'), ('bad.html', '\u2603' * 10, True, 'utf16'))
+    for filename, expected in (('good.html', 'utf8'), ('bad.html', None)):
+        resource = resources.load(harness.request_processor, harness.fs.www.resolve(filename))
+        resource.charset_check_chunk_size = 2
+        assert resource.charset == expected
+
+def test_charset_static_rejects_truncated_files(harness):
+    harness.hydrate_request_processor(charset_static='utf8')
+    harness.fs.www.mk(('index.html', b'Greetings, program! \xe2\x98', False))
+    resource = resources.load(harness.request_processor, harness.fs.www.resolve('index.html'))
+    assert resource.charset is None
+
+def test_charset_static_only_checks_the_beginning_of_large_files(harness):
+    harness.hydrate_request_processor(charset_static='utf8')
+    harness.fs.www.mk(('index.html', b'Greetings, \xe2\x98\x83 program! \xff', False))
+    resource = resources.load(harness.request_processor, harness.fs.www.resolve('index.html'))
+    resource.charset_check_chunk_size = 4
+    resource.charset_check_max_chunks = 3
+    assert resource.charset == 'utf8'
+    resource.charset = NOT_COMPUTED
+    resource.charset_check_max_chunks = None
+    assert resource.charset is None
+
+def test_charset_static_only_checks_the_beginning_of_large_files_in_ram(harness):
+    harness.hydrate_request_processor(charset_static='utf8', store_static_files_in_ram=True)
+    harness.fs.www.mk(('index.html', b'Greetings, \xe2\x98\x83 program! \xff', False))
+    resource = resources.load(harness.request_processor, harness.fs.www.resolve('index.html'))
+    assert resource.raw is not None
+    resource.charset_check_chunk_size = 4
+    resource.charset_check_max_chunks = 3
+    assert resource.charset == 'utf8'
+    resource.charset = NOT_COMPUTED
+    resource.charset_check_max_chunks = None
+    assert resource.charset is None
+
+def test_zero_copy_static_files_point_to_the_file(harness):
+    output = harness.simple( 'Greetings, program!'
+                           , 'index.html'
+                           , request_processor_configuration={ 'zero_copy_static_files': True
+                                                             , 'charset_static': 'utf8'
+                                                              }
+                            )
+    assert output.body is None
+    assert output.is_file
+    assert output.fspath == harness.fs.www.resolve('index.html')
+    assert (output.offset, output.length) == (0, 19)
+    assert output.media_type == 'text/html'
+    assert output.charset == 'utf8'
+    assert output.read() == b'Greetings, program!'
+    assert output.text == 'Greetings, program!'
+
+def test_zero_copy_static_files_only_check_the_charset_of_the_beginning(harness):
+    harness.hydrate_request_processor(charset_static='utf8', zero_copy_static_files=True)
+    harness.fs.www.mk(('index.html', b'Greetings, program! \xff', False))
+    resource = resources.load(harness.request_processor, harness.fs.www.resolve('index.html'))
+    resource.charset_check_chunk_size = 4
+    resource.charset_check_max_chunks = 1
+    output = resource.render({})
+    assert output.is_file
+    assert output.charset == 'utf8'
+
+def test_zero_copy_doesnt_apply_to_static_files_stored_in_ram(harness):
+    output = harness.simple( 'Greetings, program!'
+                           , 'index.html'
+                           , request_processor_configuration={ 'zero_copy_static_files': True
+                                                             , 'store_static_files_in_ram': True
+                                                              }
+                            )
+    assert output.body == b'Greetings, program!'
+    assert not output.is_file
+
+def test_output_can_point_to_a_file_descriptor(harness):
+    harness.fs.www.mk(('foo.txt', 'Greetings, program!'))
+    fd = os.open(harness.fs.www.resolve('foo.txt'), os.O_RDONLY)
+    try:
+        output = Output(fd=fd, offset=11, length=7)
+        assert output.is_file
+        assert output.read() == b'program'
+        assert output.read() == b'program'
+    finally:
+        os.close(fd)
+
 def test_encode_output_as_barely_working(harness):
     output = harness.simple( '[---]\n[---]\nGreetings, program!'
                            , 'index.html.spt'
@@ -133,3 +245,104 @@ def test_offset_calculation_advanced(harness):
         '\n\n\n\n\n\n[---]\n'
         'Monkey\nHead\n') #Be careful: this is implicit concation, not a tuple
     check_offsets(raw, [0, 4, 6, 13])
+
+
+# Byte ranges
+# ===========
+
+CONTENT = 'Greetings, program!'
+
+def _range(harness, range_header, if_range_header=None, **configuration):
+    if configuration or not os.path.exists(harness.fs.www.resolve('foo.txt')):
+        harness.fs.www.mk(('foo.txt', CONTENT))
+        harness.hydrate_request_processor(**configuration)
+    state = harness.request_processor.process( '/foo.txt', '', None
+                                             , raise_immediately=True
+                                             , range_header=range_header
+                                             , if_range_header=if_range_header
+                                              )
+    return state['output']
+
+def _http_date(harness):
+    from email.utils import formatdate
+    mtime = os.stat(harness.fs.www.resolve('foo.txt')).st_mtime
+    return formatdate(mtime, usegmt=True)
+
+@pytest.mark.parametrize('configuration', [{}, {'store_static_files_in_ram': True}])
+def test_static_serves_a_single_range(harness, configuration):
+    output = _range(harness, 'bytes=11-17', **configuration)
+    assert output.body == b'program'
+    assert output.ranges == [(11, 17)]
+    assert output.content_range == 'bytes 11-17/19'
+    assert output.media_type == 'text/plain'
+
+def test_static_serves_a_suffix_range(harness):
+    output = _range(harness, 'bytes=-8')
+    assert output.body == b'program!'
+    assert output.content_range == 'bytes 11-18/19'
+
+def test_static_serves_a_single_range_by_reference_in_zero_copy_mode(harness):
+    output = _range(harness, 'bytes=11-', zero_copy_static_files=True)
+    assert output.body is None
+    assert output.fspath == harness.fs.www.resolve('foo.txt')
+    assert (output.offset, output.length) == (11, 8)
+    assert output.read() == b'program!'
+
+@pytest.mark.parametrize('configuration', [ {}
+                                          , {'store_static_files_in_ram': True}
+                                          , {'zero_copy_static_files': True}
+                                           ])
+def test_static_ranges_only_check_the_charset_of_the_beginning(harness, configuration):
+    harness.hydrate_request_processor(charset_static='utf8', **configuration)
+    harness.fs.www.mk(('foo.txt', b'Greetings, program! \xff', False))
+    resource = resources.load(harness.request_processor, harness.fs.www.resolve('foo.txt'))
+    resource.charset_check_chunk_size = 4
+    resource.charset_check_max_chunks = 1
+    output = resource.render_ranges('bytes=11-17')
+    assert output.read() == b'program'
+    assert output.charset == 'utf8'
+
+@pytest.mark.parametrize('configuration', [ {}
+                                          , {'store_static_files_in_ram': True}
+                                          , {'zero_copy_static_files': True}
+                                           ])
+def test_static_serves_multiple_ranges_as_multipart(harness, configuration):
+    output = _range(harness, 'bytes=0-8,-8', **configuration)
+    assert output.ranges == [(0, 8), (11, 18)]
+    assert output.content_range is None
+    assert output.media_type.startswith('multipart/byteranges; boundary=')
+    boundary = output.media_type.split('=', 1)[1].encode('ascii')
+    assert output.body == (
+        b'\r\n--' + boundary + b'\r\nContent-Type: text/plain\r\nContent-Range: bytes 0-8/19\r\n\r\n'
+        b'Greetings'
+        b'\r\n--' + boundary + b'\r\nContent-Type: text/plain\r\nContent-Range: bytes 11-18/19\r\n\r\n'
+        b'program!'
+        b'\r\n--' + boundary + b'--\r\n'
+    )
+
+@pytest.mark.parametrize('range_header', ['items=0-1', 'bytes=9-0', 'bytes=' + ','.join(['0-1'] * 17)])
+def test_static_ignores_invalid_range_headers(harness, range_header):
+    output = _range(harness, range_header)
+    assert output.body == CONTENT.encode('ascii')
+    assert output.ranges is None
+
+def test_static_raises_RangeNotSatisfiable(harness):
+    with raises(RangeNotSatisfiable) as info:
+        _range(harness, 'bytes=19-')
+    assert info.value.content_range == 'bytes */19'
+
+def test_static_serves_ranges_if_the_if_range_date_matches(harness):
+    _range(harness, None)
+    output = _range(harness, 'bytes=0-8', if_range_header=_http_date(harness))
+    assert output.body == b'Greetings'
+
+@pytest.mark.parametrize('if_range_header', ['"an-etag"', 'W/"an-etag"', 'Thu, 01 Jan 1970 00:00:00 GMT', 'garbage'])
+def test_static_serves_the_whole_file_if_the_if_range_doesnt_match(harness, if_range_header):
+    output = _range(harness, 'bytes=0-8', if_range_header=if_range_header)
+    assert output.body == CONTENT.encode('ascii')
+    assert output.ranges is None
+
+def test_static_fast_lane_serves_ranges(harness):
+    _range(harness, None)
+    assert '/foo.txt' in harness.request_processor.get_static_routes()
+    assert _range(harness, 'bytes=-1').body == b'!'
@@ -4,11 +4,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import mimetypes
+
 import pytest
 from pytest import raises, fixture
 
 from aspen.exceptions import NegotiationFailure, NotFound
-from aspen.http.resource import mimetypes
 from aspen.simplates.simplate import _decode
 from aspen.simplates.simplate import Simplate
 from aspen.simplates.pagination import Page
@@ -160,8 +161,8 @@ def test_render_negotation_failures_include_available_types(harness):
     assert actual == expected
 
 def test_treat_media_type_variants_as_equivalent(harness):
-    _guess_type = mimetypes.guess_type
-    mimetypes.guess_type = lambda url, **kw: ('application/x-javascript' if url.endswith('.js') else '', None)
+    _js_type = mimetypes.types_map['.js']
+    mimetypes.types_map['.js'] = 'application/x-javascript'
     try:
         output = harness.simple(
             filepath='foobar.spt',
@@ -170,7 +171,31 @@ def test_treat_media_type_variants_as_equivalent(harness):
         )
         assert output.media_type == "application/javascript"
     finally:
-        mimetypes.guess_type = _guess_type
+        mimetypes.types_map['.js'] = _js_type
+
+def test_negotiation_outcomes_are_memoized(harness):
+    state = harness.simple(filepath='index.spt', contents=SIMPLATE, accept_header='text/html',
+                           want='state')
+    resource = state['resource']
+    assert resource.negotiate(state) == 'text/html'
+    assert resource._negotiation_cache.get(('text/html', None)) == 'text/html'
+
+def test_memoized_negotiation_failures_raise_fresh_exceptions(harness):
+    state = harness.simple(filepath='index.spt', contents=SIMPLATE, want='state')
+    state['accept_header'] = 'cheese/head'
+    resource = state['resource']
+    first = raises(NegotiationFailure, resource.negotiate, state).value
+    second = raises(NegotiationFailure, resource.negotiate, state).value
+    assert first is not second
+    assert first.message == second.message
+
+def test_negotiation_cache_is_bounded(harness):
+    state = harness.simple(filepath='index.spt', contents=SIMPLATE, want='state')
+    resource = state['resource']
+    for i in range(resource.negotiation_cache_size + 10):
+        state['accept_header'] = 'text/html;level=%i' % i
+        resource.negotiate(state)
+    assert len(resource._negotiation_cache) == resource.negotiation_cache_size
 
 
 from aspen.simplates.renderers import Renderer, Factory
@@ -362,6 +387,79 @@ Template""")
     assert output.text == 'Template'
 
 
+# prerender
+
+def test_constant_pages_are_prerendered(get):
+    simplate = get(raw=b"foo = 'bar'\n[---]\n[---] text/plain via stdlib_format\n{foo}")
+    assert simplate.prerendered['text/plain']['body'] == b'bar'
+
+def test_pages_that_read_the_request_arent_prerendered(get):
+    simplate = get(raw=b"[---]\n[---] text/plain via stdlib_format\n{path}")
+    assert simplate.prerendered == {}
+
+def test_pages_with_run_every_logic_arent_prerendered(get):
+    simplate = get(raw=b"foo = 'bar'\n[---]\nfoo = path.raw\n[---] text/plain\n%(foo)s")
+    assert simplate.prerendered == {}
+
+def test_pages_that_read_mutable_objects_arent_prerendered(get):
+    simplate = get(raw=b"import os\nsettings = os.environ\n[---]\n[---] text/plain via stdlib_format\n{settings[HOME]}")
+    assert simplate.prerendered == {}
+
+def test_pages_that_read_objects_with_changing_str_arent_prerendered(harness):
+    harness.fs.www.mk(('index.spt', """
+import itertools
+class Counter(object):
+    count = itertools.count()
+    def __str__(self):
+        return str(next(self.count))
+counter = Counter()
+[---]
+[---] text/plain via stdlib_format
+{counter}"""))
+    assert harness.simple(filepath=None).text == '0'
+    assert harness.simple(filepath=None).text == '1'
+
+def test_pages_that_read_tuples_of_literals_are_prerendered(get):
+    simplate = get(raw=b"foo = ('a', 1, None)\n[---]\n[---] text/plain via stdlib_format\n{foo[0]}")
+    assert simplate.prerendered['text/plain']['body'] == b'a'
+
+def test_constant_can_be_declared(get):
+    simplate = get(raw=b"__constant__ = True\n[---]\nfoo = 1 + 1\n[---] text/plain\n%(foo)s")
+    assert simplate.prerendered['text/plain']['body'] == b'2'
+
+def test_constant_can_be_declined(get):
+    simplate = get(raw=b"__constant__ = False\nfoo = 'bar'\n[---]\n[---] text/plain\n%(foo)s")
+    assert simplate.prerendered == {}
+
+def test_nothing_is_prerendered_when_changes_reload_is_on(get, harness):
+    harness.hydrate_request_processor(changes_reload=True)
+    simplate = get( request_processor=harness.request_processor
+                  , raw=b"foo = 'bar'\n[---]\n[---] text/plain\n%(foo)s"
+                   )
+    assert simplate.prerendered == {}
+
+def test_prerendered_output_is_served(harness):
+    state = harness.simple("""
+foo = 'Template'
+[---]
+[---] text/plain via stdlib_format
+{foo}
+[---] text/html via stdlib_template
+<foo>$foo</foo>""", filepath='index.spt', accept_header='text/html', want='state')
+    output = state['output']
+    assert output.body == b'<foo>Template</foo>'
+    assert output.media_type == 'text/html'
+    assert output.charset == 'UTF-8'
+    assert state['resource'].prerendered['text/html']['body'] == b'<foo>Template</foo>'
+
+def test_prerendered_output_is_a_fresh_object(harness):
+    harness.fs.www.mk(('index.spt', "[---]\n[---] text/plain\nGreetings, program!"))
+    first = harness.simple(filepath=None, uripath='/')
+    first.body = b'mutated'
+    second = harness.simple(filepath=None, uripath='/')
+    assert second.body == b'Greetings, program!'
+
+
 # _decode
 
 def test_decode_can_take_encoding_from_first_line():